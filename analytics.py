@@ -0,0 +1,232 @@
+# analytics.py
+"""
+Per-n-gram and per-player reaction statistics, and an adaptive n-gram picker.
+
+Every key keeps exponentially decayed online statistics: a Welford
+mean/variance of reaction times plus a timeout rate. Each update is O(1), so
+the game can feed turns in as they happen, and old play fades out at the
+rate set by `decay`.
+
+The aggregates are stored as a flat table of fixed-size records which loads
+with a single read. Rebuild it from the event log with:
+
+    python3 analytics.py events.log.2 events.log.1 events.log
+"""
+
+import math
+import os
+import struct
+import sys
+
+import eventlog
+
+TABLE_PATH = "analytics.table"
+
+NGRAM, PLAYER = 0, 1
+
+# A reaction time prior for keys with no presses yet, in ms.
+PRIOR_MEAN = 2500.0
+PRIOR_SD = 1200.0
+# Floor for the spread, so a handful of identical times can't make the
+# prediction a hard 0 or 1.
+MIN_SD = 100.0
+# Turns of prior weight pulling a key's timeout rate towards the overall
+# one, so one early miss doesn't mark an n-gram as impossible.
+PRIOR_TRIALS = 5.0
+
+class OnlineStat:
+    """Decayed Welford mean/variance of reaction times plus timeout rate."""
+
+    __slots__ = ("weight", "mean", "m2", "trials", "timeouts")
+
+    def __init__(self, weight=0.0, mean=0.0, m2=0.0, trials=0.0, timeouts=0.0):
+        self.weight = weight
+        self.mean = mean
+        self.m2 = m2
+        self.trials = trials
+        self.timeouts = timeouts
+
+    def add_reaction(self, ms, decay):
+        self.weight = self.weight * decay + 1.0
+        delta = ms - self.mean
+        self.mean += delta / self.weight
+        self.m2 = self.m2 * decay + delta * (ms - self.mean)
+        self.trials = self.trials * decay + 1.0
+        self.timeouts *= decay
+
+    def add_timeout(self, decay):
+        self.trials = self.trials * decay + 1.0
+        self.timeouts = self.timeouts * decay + 1.0
+
+    def variance(self):
+        return self.m2 / self.weight if self.weight > 1.0 else PRIOR_SD ** 2
+
+    def timeout_rate(self):
+        return self.timeouts / self.trials if self.trials else 0.0
+
+class Analytics:
+
+    def __init__(self, decay=0.98):
+        self.decay = decay
+        self.ngrams = {}
+        self.players = {}
+        self.overall = OnlineStat()
+        # Newest event time folded in, so re-ingesting a log is incremental.
+        self.last_time = 0.0
+
+    def _stat(self, table, key):
+        stat = table.get(key)
+        if stat is None:
+            stat = table[key] = OnlineStat()
+        return stat
+
+    ###########################################################################
+    # UPDATES
+    ###########################################################################
+    def record_press(self, ngram, player, ms):
+        for stat in (self._stat(self.ngrams, ngram),
+                     self._stat(self.players, player), self.overall):
+            stat.add_reaction(ms, self.decay)
+
+    def record_timeout(self, ngram, player):
+        for stat in (self._stat(self.ngrams, ngram),
+                     self._stat(self.players, player), self.overall):
+            stat.add_timeout(self.decay)
+
+    def ingest(self, events):
+        """Folds in eventlog.read_events() tuples newer than last_time."""
+        ngram = ""
+        for t, kind, player, lives, value, shown in events:
+            if kind == eventlog.NGRAM_SHOWN:
+                ngram = shown
+            if t <= self.last_time:
+                continue
+            if kind == eventlog.PRESS:
+                self.record_press(ngram, player, value)
+            elif kind == eventlog.TIMEOUT:
+                self.record_timeout(ngram, player)
+            self.last_time = t
+
+    ###########################################################################
+    # PREDICTION AND SAMPLING
+    ###########################################################################
+    def _mean(self, stat):
+        if stat is None or stat.weight < 1.0:
+            return self.overall.mean if self.overall.weight >= 1.0 else PRIOR_MEAN
+        return stat.mean
+
+    def _miss_rate(self, stat):
+        base = self.overall.timeout_rate()
+        if stat is None:
+            return base
+        return (stat.timeouts + PRIOR_TRIALS * base) / (stat.trials + PRIOR_TRIALS)
+
+    def predicted_success(self, ngram, players, round_time):
+        """
+        Chance that a turn on this n-gram beats round_time (seconds), averaged
+        over the given players. A player's expected reaction is their own mean
+        shifted by how much slower or faster this n-gram is than average.
+
+        Reaction times only come from presses, so they say nothing about the
+        turns that timed out; an n-gram players often miss would look easy
+        from them alone. Each turn therefore has to escape a miss first, at
+        the n-gram's timeout rate shifted by how much more or less often
+        this player times out than average (both smoothed towards the
+        overall rate).
+        """
+        base = self._mean(None)
+        base_miss = self._miss_rate(None)
+        ngram_stat = self.ngrams.get(ngram)
+        shift = self._mean(ngram_stat) - base
+        miss_shift = self._miss_rate(ngram_stat) - base_miss
+        sd = max(MIN_SD, math.sqrt(ngram_stat.variance() if ngram_stat else PRIOR_SD ** 2))
+        limit = round_time * 1000.0
+        total = 0.0
+        for player in players:
+            player_stat = self.players.get(player)
+            mean = self._mean(player_stat) + shift
+            miss = min(1.0, max(0.0, self._miss_rate(player_stat) + miss_shift))
+            z = (limit - mean) / (sd * math.sqrt(2.0))
+            total += (1.0 - miss) * 0.5 * (1.0 + math.erf(z))
+        return total / len(players) if players else 1.0
+
+    def picker(self, players, round_time, target=0.75):
+        """
+        Returns a function choosing, from a list of candidate n-grams, the
+        index of the one whose predicted success is closest to target.
+        """
+        def pick(candidates):
+            scores = [abs(self.predicted_success(n, players, round_time) - target)
+                      for n in candidates]
+            return scores.index(min(scores))
+        return pick
+
+    def hardest(self, count=10):
+        ranked = sorted(self.ngrams.items(), key=lambda kv: -kv[1].timeout_rate())
+        return ranked[:count]
+
+    ###########################################################################
+    # TABLE FILE
+    ###########################################################################
+    # key, kind, weight, mean, m2, trials, timeouts
+    _HEADER = struct.Struct("<4sfd")
+    _RECORD = struct.Struct("<4sBfffff")
+    _MAGIC = b"NGAT"
+
+    def save(self, path=TABLE_PATH):
+        parts = [self._HEADER.pack(self._MAGIC, self.decay, self.last_time)]
+        rows = [(k.encode("ascii", "replace")[:4], NGRAM, s) for k, s in self.ngrams.items()]
+        rows += [(bytes([k]), PLAYER, s) for k, s in self.players.items()]
+        for key, kind, s in rows:
+            parts.append(self._RECORD.pack(key, kind, s.weight, s.mean, s.m2,
+                                           s.trials, s.timeouts))
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=TABLE_PATH, decay=0.98):
+        """Loads a saved table; a missing or unreadable one gives an empty set."""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            magic, decay, last_time = cls._HEADER.unpack_from(data)
+            if magic != cls._MAGIC:
+                raise ValueError("Not an analytics table")
+        except (OSError, ValueError, struct.error):
+            return cls(decay)
+        stats = cls(decay)
+        stats.last_time = last_time
+        body = data[cls._HEADER.size:]
+        body = body[:len(body) - len(body) % cls._RECORD.size]
+        for key, kind, *values in cls._RECORD.iter_unpack(body):
+            if kind == NGRAM:
+                stats.ngrams[key.rstrip(b"\0").decode("ascii")] = OnlineStat(*values)
+            else:
+                stats.players[key[0]] = OnlineStat(*values)
+        for s in stats.ngrams.values():
+            stats.overall.weight += s.weight
+            stats.overall.mean += s.mean * s.weight
+            stats.overall.trials += s.trials
+            stats.overall.timeouts += s.timeouts
+        if stats.overall.weight:
+            stats.overall.mean /= stats.overall.weight
+        return stats
+
+def main(paths):
+    stats = Analytics.load()
+    for path in paths:
+        stats.ingest(eventlog.read_events(path))
+    stats.save()
+    print(f"{len(stats.ngrams)} n-grams, {len(stats.players)} players")
+    for ngram, s in stats.hardest():
+        print(f"{ngram:4} timeout rate {s.timeout_rate():.0%}, "
+              f"mean reaction {s.mean:.0f} ms")
+    for player, s in sorted(stats.players.items()):
+        print(f"Player {player + 1}: mean {s.mean:.0f} ms, "
+              f"sd {math.sqrt(s.variance()):.0f} ms, "
+              f"timeout rate {s.timeout_rate():.0%}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or [eventlog.LOG_PATH])
@@ -0,0 +1,206 @@
+# assetpack.py
+"""
+Letter art packed into one memory-mapped file.
+
+The per-letter JPEGs are lossy, slow to decode on the Pi and opened one at
+a time. The pack holds every letter already converted to 1-bit, for one or
+more art styles, behind a small index:
+
+    header   magic "NGAP", version, style count, glyph count
+    styles   16-byte name per style, in style id order
+    index    style id, character code, width, height, offset per glyph
+    bitmaps  rows of PIL "1" mode bytes (MSB first, 1 = white), each row
+             padded to a whole byte
+
+At runtime AssetPack maps the file read-only: loading every letter is one
+open() and glyphs are sliced straight out of the mapping, no decoding. A
+style can have variants for a given n-gram length, named "style/N" (e.g.
+narrower trigram cells from fontbuild.py); compose() picks them up.
+
+Build a pack from directories of letter images, one --style per art style.
+A directory may name its images after the letter (A.jpg) or number them
+from 1 (0001.jpg for A), like letters/ and bigrams/:
+
+    python3 assetpack.py letters.pack --style blender=bigrams --style plain=letters
+    python3 assetpack.py letters.pack          # list what's in a pack
+"""
+
+import argparse
+import mmap
+import os
+import struct
+
+PACK_PATH = "letters.pack"
+CHARSET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+MAGIC = b"NGAP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHH")
+STYLE = struct.Struct("<16s")
+ENTRY = struct.Struct("<BBHHI")
+
+def _row_bytes(width):
+    return (width + 7) // 8
+
+###############################################################################
+# RUNTIME
+###############################################################################
+class AssetPack:
+
+    def __init__(self, path=PACK_PATH):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self._map = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+        magic, version, style_count, glyph_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {VERSION} letter pack")
+        pos = HEADER.size
+        self.styles = []
+        for _ in range(style_count):
+            self.styles.append(STYLE.unpack_from(self._map, pos)[0].rstrip(b"\0").decode())
+            pos += STYLE.size
+        self._index = {}
+        for _ in range(glyph_count):
+            style, code, width, height, offset = ENTRY.unpack_from(self._map, pos)
+            self._index[self.styles[style], chr(code)] = (offset, width, height)
+            pos += ENTRY.size
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def chars(self, style=None):
+        style = style or self.styles[0]
+        return "".join(sorted(ch for s, ch in self._index if s == style))
+
+    def bitmap(self, char, style=None):
+        """Returns (width, height, memoryview of the packed rows)."""
+        offset, width, height = self._index[style or self.styles[0], char.upper()]
+        size = _row_bytes(width) * height
+        return width, height, memoryview(self._map)[offset:offset + size]
+
+    def glyph(self, char, style=None):
+        """The glyph as a PIL "1" image."""
+        from PIL import Image
+
+        width, height, data = self.bitmap(char, style)
+        return Image.frombuffer("1", (width, height), data, "raw", "1", 0, 1)
+
+    def compose(self, text, style=None, width=None):
+        """
+        Glyphs for text side by side, centred on a canvas at least width
+        wide, or None if none of them are packed.
+        """
+        from PIL import Image
+
+        style = style or self.styles[0]
+        if f"{style}/{len(text)}" in self.styles:
+            style = f"{style}/{len(text)}"
+        glyphs = [self.glyph(ch, style) for ch in text if (style, ch.upper()) in self._index]
+        if not glyphs:
+            return None
+        total = sum(g.width for g in glyphs)
+        combined = Image.new("1", (max(total, width or 0),
+                                   max(g.height for g in glyphs)), 1)
+        x = (combined.width - total) // 2
+        for g in glyphs:
+            combined.paste(g, (x, 0))
+            x += g.width
+        return combined
+
+    def close(self):
+        self._map.close()
+
+###############################################################################
+# PACKER
+###############################################################################
+def find_images(directory, charset=CHARSET):
+    """Maps each character to its image in directory, by letter or by number."""
+    names = {os.path.splitext(n)[0].upper(): n for n in os.listdir(directory)}
+    found = {}
+    for i, ch in enumerate(charset, 1):
+        name = names.get(ch) or names.get(f"{i:04d}")
+        if name is not None:
+            found[ch] = os.path.join(directory, name)
+    return found
+
+def write_pack(path, styles):
+    """
+    Writes a pack from styles, a list of (name, {char: PIL image}), and
+    returns the number of glyphs.
+    """
+    glyphs = []
+    for style_id, (name, images) in enumerate(styles):
+        if len(name.encode()) > STYLE.size:
+            raise ValueError(f"style name {name!r} is longer than {STYLE.size} bytes")
+        for ch, img in sorted(images.items()):
+            bitmap = img if img.mode == "1" else img.convert("1")
+            glyphs.append((style_id, ord(ch), bitmap.width, bitmap.height, bitmap.tobytes()))
+
+    offset = HEADER.size + STYLE.size * len(styles) + ENTRY.size * len(glyphs)
+    index = []
+    for style_id, code, width, height, data in glyphs:
+        index.append(ENTRY.pack(style_id, code, width, height, offset))
+        offset += len(data)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(styles), len(glyphs)))
+        for name, _ in styles:
+            f.write(STYLE.pack(name.encode()))
+        f.writelines(index)
+        f.writelines(g[4] for g in glyphs)
+    os.replace(tmp, path)
+    return len(glyphs)
+
+def read_styles(path=PACK_PATH):
+    """An existing pack's styles, in the form write_pack() takes."""
+    pack = AssetPack(path)
+    styles = [(style, {ch: pack.glyph(ch, style) for ch in pack.chars(style)})
+              for style in pack.styles]
+    pack.close()
+    return styles
+
+def build(path, styles):
+    """
+    Writes a pack from styles, a list of (name, {char: image path}), and
+    returns the number of glyphs.
+    """
+    from PIL import Image
+
+    loaded = []
+    for name, images in styles:
+        bitmaps = {}
+        for ch, image_path in images.items():
+            with Image.open(image_path) as img:
+                # Same conversion the game applied to the JPEGs on every
+                # round, done once here.
+                bitmaps[ch] = img.convert("1")
+        loaded.append((name, bitmaps))
+    return write_pack(path, loaded)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("pack", nargs="?", default=PACK_PATH)
+    parser.add_argument("--style", action="append", default=[], metavar="NAME=DIR",
+                        help="add a style from a directory of letter images")
+    args = parser.parse_args()
+
+    if args.style:
+        styles = []
+        for spec in args.style:
+            name, _, directory = spec.partition("=")
+            styles.append((name, find_images(directory)))
+        print(f"Packed {build(args.pack, styles)} glyphs into {args.pack}")
+
+    pack = AssetPack(args.pack)
+    for style in pack.styles:
+        print(f"{style:16} {pack.chars(style)}")
+    print(f"{os.path.getsize(args.pack)} bytes")
+    pack.close()
+
+if __name__ == "__main__":
+    main()
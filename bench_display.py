@@ -0,0 +1,177 @@
+# bench_display.py
+"""
+Frame-time benchmark for the panel transports on the same workloads.
+
+    python3 bench_display.py --spi --spi3 --i2c --frames 300
+    python3 bench_display.py --fake          # no hardware: CPU cost + wire estimate
+
+Workloads (each frame differs from the one before, as in the game):
+    full      every page changes (slide-ins, flashes)
+    letters   alternating between two n-gram frames
+    one-page  a single page changes (a countdown bar, a cursor)
+
+For every transport it prints the measured write_frame() time and the
+bytes put on the bus per frame, plus the time those bytes need on the wire
+at the bus rate: 8 bits per byte on SPI; on I2C 9 bits per byte (ACK), one
+address byte and start/stop per message.
+"""
+
+import argparse
+import random
+import time
+
+import i2cbus
+import sh1106
+
+###############################################################################
+# WORKLOADS
+###############################################################################
+def workloads(seed=0):
+    rng = random.Random(seed)
+
+    def noise():
+        return bytes(rng.getrandbits(8) for _ in range(sh1106.FRAME_SIZE))
+
+    a, b = noise(), noise()
+    full = [a, bytes(x ^ 0xFF for x in a)]
+    letters = [a, b]
+    bar = bytearray(a)
+    one_page = []
+    for i in range(2):
+        bar[7 * sh1106.WIDTH:] = bytes([0xFF if i else 0x00]) * sh1106.WIDTH
+        one_page.append(bytes(bar))
+    return {"full": full, "letters": letters, "one-page": one_page}
+
+###############################################################################
+# WIRE ACCOUNTING
+###############################################################################
+class Wire:
+    """Counts what a transport puts on the bus."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.messages = 0
+
+    def spi(self, write):
+        def counted(data):
+            self.bytes += len(data)
+            self.messages += 1
+            write(data)
+        return counted
+
+    def i2c(self, write_many):
+        def counted(messages):
+            self.bytes += sum(len(m) for m in messages)
+            self.messages += len(messages)
+            write_many(messages)
+        return counted
+
+    def seconds(self, kind, hz):
+        if kind == "i2c":
+            # Address byte + start/stop per message, an ACK bit per byte.
+            return ((self.bytes + self.messages) * 9 + 2 * self.messages) / hz
+        return self.bytes * 8 / hz
+
+def attach(panel, kind):
+    wire = Wire()
+    if kind == "i2c":
+        panel.bus.write_many = wire.i2c(panel.bus.write_many)
+    else:
+        panel._write = wire.spi(panel._write)
+    return wire
+
+###############################################################################
+# TRANSPORTS
+###############################################################################
+class _NullSPI:
+    def writebytes2(self, data):
+        pass
+
+    def close(self):
+        pass
+
+class _NullGPIO:
+    OUT = 0
+    HIGH = 1
+
+    def setup(self, *args, **kwargs):
+        pass
+
+    def output(self, pin, value):
+        pass
+
+class _NullI2C(i2cbus.I2CBus):
+    def __init__(self):
+        self.max_chunk = i2cbus.MAX_CHUNK
+
+    def write_many(self, messages):
+        pass
+
+    def close(self):
+        pass
+
+def open_panels(args):
+    """Yields (name, kind, bus rate in Hz, panel)."""
+    if args.fake:
+        yield "spi 4-wire (no hw)", "spi", args.spi_hz, sh1106.SH1106(_NullSPI(), _NullGPIO())
+        yield "spi 3-wire (no hw)", "spi", args.spi_hz, sh1106.SH1106(_NullSPI(), _NullGPIO(),
+                                                                      three_wire=True)
+        yield "i2c (no hw)", "i2c", args.i2c_hz, sh1106.SH1106I2C(_NullI2C())
+        return
+    if args.spi:
+        yield "spi 4-wire", "spi", args.spi_hz, sh1106.open_spi_panel(speed_hz=args.spi_hz)
+    if args.spi3:
+        yield "spi 3-wire", "spi", args.spi_hz, sh1106.open_spi_panel(speed_hz=args.spi_hz,
+                                                                      three_wire=True)
+    if args.i2c:
+        rate = i2cbus.bus_speed(args.i2c_bus) or args.i2c_hz
+        yield "i2c", "i2c", rate, sh1106.open_i2c_panel(args.i2c_bus, args.i2c_address,
+                                                         args.controller)
+
+###############################################################################
+# MAIN
+###############################################################################
+def bench(panel, kind, frames, count):
+    panel.resync()
+    panel.write_frame(frames[-1])
+    wire = attach(panel, kind)
+    times = []
+    for i in range(count):
+        started = time.perf_counter()
+        panel.write_frame(frames[i % len(frames)])
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return times, wire
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--spi", action="store_true", help="4-wire SPI panel")
+    parser.add_argument("--spi3", action="store_true", help="3-wire SPI panel")
+    parser.add_argument("--i2c", action="store_true", help="I2C panel")
+    parser.add_argument("--fake", action="store_true", help="no hardware: null transports")
+    parser.add_argument("--spi-hz", type=int, default=1000000)
+    parser.add_argument("--i2c-hz", type=int, default=400000,
+                        help="I2C rate to assume if the kernel doesn't report one")
+    parser.add_argument("--i2c-bus", type=int, default=1)
+    parser.add_argument("--i2c-address", type=lambda v: int(v, 0), default=0x3C)
+    parser.add_argument("--controller", choices=("sh1106", "ssd1306"), default="sh1106")
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+    if not (args.spi or args.spi3 or args.i2c or args.fake):
+        args.spi = args.i2c = True
+
+    loads = workloads()
+    print(f"{'transport':20} {'workload':9} {'p50 ms':>8} {'p95 ms':>8} {'fps':>7} "
+          f"{'bytes':>6} {'wire ms':>8}")
+    for name, kind, hz, panel in open_panels(args):
+        for load, frames in loads.items():
+            times, wire = bench(panel, kind, frames, args.frames)
+            mean = sum(times) / len(times)
+            per = 1.0 / len(times)
+            print(f"{name:20} {load:9} {times[len(times) // 2] * 1e3:8.2f} "
+                  f"{times[len(times) * 95 // 100] * 1e3:8.2f} {1 / mean:7.0f} "
+                  f"{wire.bytes * per:6.0f} {wire.seconds(kind, hz) * per * 1e3:8.2f}")
+        panel.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# buttons.py
+"""
+Edge-driven button input.
+
+The A/B/C buttons are registered once for falling-edge detection. Presses
+land in a queue, so menus block on get() instead of polling GPIO.input()
+in a sleep loop, and an optional callback(label, when) sees every press as
+it happens (the game uses it to time turns). With the gpiod backend all
+three lines are one bulk request and `when` is the kernel's timestamp of
+the edge; with RPi.GPIO it is the time the callback ran.
+
+get() waits through clock.wait(), so its timeouts run on whatever clock is
+in use: ScaledClock speeds them up, and under VirtualClock a press
+scheduled with call_later() ends the wait at its virtual time.
+"""
+
+import collections
+import threading
+
+import clock
+
+BUTTONS = {"A": 17, "B": 27, "C": 22}
+
+class Buttons:
+
+    def __init__(self, gpio, pins=BUTTONS, callback=None, bouncetime=200):
+        self.gpio = gpio
+        self.pins = dict(pins)
+        self.callback = callback
+        self._labels = {pin: label for label, pin in self.pins.items()}
+        self._presses = collections.deque()
+        self._pressed = threading.Event()
+        for pin in self.pins.values():
+            gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+        if hasattr(gpio, "watch"):
+            gpio.watch(self.pins.values(), self._edge, gpio.FALLING, bouncetime)
+        else:
+            for pin in self.pins.values():
+                gpio.add_event_detect(pin, gpio.FALLING, callback=self._edge,
+                                      bouncetime=bouncetime)
+
+    def _edge(self, pin, when=None):
+        label = self._labels[pin]
+        if when is None:
+            when = clock.now()
+        if self.callback is not None:
+            self.callback(label, when)
+        self._presses.append((label, when))
+        self._pressed.set()
+
+    def get(self, options=None, timeout=None):
+        """
+        Blocks until one of options (default: any) is pressed and returns its
+        label, or None after timeout seconds.
+        """
+        deadline = None if timeout is None else clock.now() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - clock.now()
+            if remaining is not None and remaining <= 0:
+                return None
+            if not self._presses:
+                # Cleared before the check, so a press landing in between
+                # still sets it and ends the wait.
+                self._pressed.clear()
+                if not self._presses and not clock.wait(self._pressed, remaining):
+                    return None
+                continue
+            label, _ = self._presses.popleft()
+            if options is None or label in options:
+                return label
+
+    def clear(self):
+        """Drops presses that happened while nobody was listening."""
+        self._presses.clear()
+
+    def close(self):
+        for pin in self.pins.values():
+            self.gpio.remove_event_detect(pin)
@@ -0,0 +1,154 @@
+# clock.py
+"""
+Injectable clock for all game and UI timing.
+
+Code that waits or measures game time goes through this module instead of
+time.time()/time.sleep():
+
+    clock.now()                 seconds, monotonic
+    clock.sleep(seconds)
+    clock.sleep_until(deadline) absolute deadlines, so loops don't drift
+    clock.wait(event, timeout)  threading.Event wait; True if it was set
+                                (timeout None: until it is)
+    clock.call_later(delay, fn)  returns a timer with cancel()
+
+By default these run on MonotonicClock, which can't jump with NTP or manual
+date changes. Simulations and tests swap in a VirtualClock with use(): its
+time only moves when somebody sleeps or waits, and callbacks scheduled with
+call_later() fire at their virtual time, so hours of play take milliseconds.
+ScaledClock keeps real threads and sleeps but runs them faster, for code
+that waits across threads (see soak.py).
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+class MonotonicClock:
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def sleep_until(self, deadline):
+        self.sleep(deadline - self.now())
+
+    def wait(self, event, timeout=None):
+        return event.wait(None if timeout is None else max(0.0, timeout))
+
+    def call_later(self, delay, fn):
+        timer = threading.Timer(max(0.0, delay), fn)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+class ScaledClock(MonotonicClock):
+    """
+    Real threads and sleeps, but speed times faster: soak runs play hours of
+    games in minutes without changing the code paths they exercise.
+    """
+
+    def __init__(self, speed):
+        self.speed = speed
+        self._origin = time.monotonic()
+
+    def now(self):
+        return self._origin + (time.monotonic() - self._origin) * self.speed
+
+    def sleep(self, seconds):
+        super().sleep(seconds / self.speed)
+
+    def wait(self, event, timeout=None):
+        return super().wait(event, None if timeout is None else timeout / self.speed)
+
+    def call_later(self, delay, fn):
+        return super().call_later(delay / self.speed, fn)
+
+class _VirtualTimer:
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def cancel(self):
+        self.fn = None
+
+class VirtualClock:
+    """Time that only moves when something sleeps or waits on it."""
+
+    def __init__(self, start=0.0):
+        self.t = start
+        self._timers = []
+        self._seq = itertools.count()
+
+    def now(self):
+        return self.t
+
+    def call_later(self, delay, fn):
+        timer = _VirtualTimer(fn)
+        heapq.heappush(self._timers, (self.t + max(0.0, delay), next(self._seq), timer))
+        return timer
+
+    def advance_to(self, deadline, event=None):
+        """
+        Runs every callback due up to deadline, in time order, stopping
+        early if event gets set. Returns with the clock at the stop point.
+        """
+        while self._timers and self._timers[0][0] <= deadline:
+            when, _, timer = heapq.heappop(self._timers)
+            if timer.fn is None:
+                continue
+            self.t = max(self.t, when)
+            timer.fn()
+            if event is not None and event.is_set():
+                return
+        self.t = max(self.t, deadline)
+
+    def sleep(self, seconds):
+        self.advance_to(self.t + max(0.0, seconds))
+
+    def sleep_until(self, deadline):
+        self.advance_to(deadline)
+
+    def wait(self, event, timeout=None):
+        if timeout is None:
+            # Only a callback can set it: run them until one does, or none
+            # are left (False, rather than blocking a single thread forever).
+            while not event.is_set() and self._timers:
+                self.advance_to(self._timers[0][0], event)
+        elif not event.is_set():
+            self.advance_to(self.t + max(0.0, timeout), event)
+        return event.is_set()
+
+###############################################################################
+# MODULE-LEVEL CLOCK
+###############################################################################
+_current = MonotonicClock()
+
+def use(new_clock):
+    """Swaps the clock used by every timing site; returns the old one."""
+    global _current
+    old, _current = _current, new_clock
+    return old
+
+def current():
+    return _current
+
+def now():
+    return _current.now()
+
+def sleep(seconds):
+    _current.sleep(seconds)
+
+def sleep_until(deadline):
+    _current.sleep_until(deadline)
+
+def wait(event, timeout=None):
+    return _current.wait(event, timeout)
+
+def call_later(delay, fn):
+    return _current.call_later(delay, fn)
@@ -0,0 +1,257 @@
+# desktop.py
+"""
+Desktop (Linux/macOS/Windows) frontend for the n-gram game, on Tk.
+
+Runs the same engine as the device (engine.run_game) with the keyboard as
+the button, for development and demos. It replaces "linux version.py",
+which only ran on Windows (msvcrt), read its word lists from one user's
+Downloads folder and kept Tk alive by calling update() every 0.1 s, so it
+spun the CPU and noticed a key up to 100 ms late.
+
+Here Tk's own event loop runs the window: key presses arrive through key
+bindings and are timestamped in the handler, and the countdown is an
+after() timer. The engine runs on a worker thread and blocks in
+clock.wait() on the press event, the same way returner6.py waits on the
+button. The worker queues display updates and wakes Tk with a virtual
+event (not a file handler, which Tk doesn't have on Windows), so neither
+side polls. Each n-gram's image is built once and its PhotoImage reused
+when the n-gram comes up again.
+
+    python3 desktop.py [players] [round time] [lives] [--style NAME] [--scale N]
+
+Space (or any letter key) is the button; Escape quits.
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+
+import clock
+import engine
+import gamestate
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BIGRAMS_PATH = os.path.join(HERE, "top_300_bigrams.json")
+TRIGRAMS_PATH = os.path.join(HERE, "top_300_trigrams.json")
+COUNTDOWN_MS = 50
+LETTER_FONT = ("Helvetica", 96, "bold")
+
+def load_ngrams():
+    with open(BIGRAMS_PATH) as f:
+        bigrams = json.load(f)["top_300_bigrams"]
+    with open(TRIGRAMS_PATH) as f:
+        trigrams = json.load(f)["top_300_trigrams"]
+    return bigrams, trigrams
+
+def open_letters():
+    """The letter pack (assetpack.py), or None to draw the n-grams as text."""
+    try:
+        import PIL  # noqa: F401  (compose() needs it)
+        import assetpack
+        return assetpack.AssetPack(os.path.join(HERE, assetpack.PACK_PATH))
+    except (ImportError, OSError, ValueError):
+        return None
+
+def _pgm(image):
+    """A PIL image as a binary PGM, which PhotoImage reads without ImageTk."""
+    gray = image.convert("L")
+    return b"P5 %d %d 255\n" % gray.size + gray.tobytes()
+
+###############################################################################
+# WINDOW (Tk thread)
+###############################################################################
+class DesktopView:
+
+    def __init__(self, root, letters=None, style=None, scale=4):
+        import tkinter
+
+        self.tk = tkinter
+        self.root = root
+        self.letters = letters
+        self.style = style
+        self.scale = scale
+        self.images = {}
+        self.pressed = threading.Event()
+        self.press_time = 0.0
+        self.on_restart = None
+        self._accepting = False
+        self._deadline = None
+        self._countdown = None
+
+        root.title("N-gram game")
+        root.configure(background="black")
+        self.status = tkinter.Label(root, font=("Helvetica", 16), fg="white", bg="black")
+        self.status.pack(fill="x", pady=8)
+        self.letters_label = tkinter.Label(root, font=LETTER_FONT, fg="white", bg="black",
+                                           borderwidth=0)
+        self.letters_label.pack(expand=True, padx=24, pady=24)
+        self.timer = tkinter.Label(root, font=("Helvetica", 24), fg="white", bg="black")
+        self.timer.pack(fill="x", pady=8)
+        self.lives = tkinter.Label(root, font=("Courier", 16), fg="white", bg="black")
+        self.lives.pack(fill="x", pady=8)
+
+        root.bind("<Key>", self.key)
+        root.bind("<Escape>", lambda event: root.destroy())
+
+        # Updates from the game thread: queued, then announced with a
+        # virtual event, which a threaded Tcl (as Python ships) hands over
+        # to the Tk thread's event loop.
+        self._calls = queue.Queue()
+        root.bind("<<GameCall>>", self._drain)
+
+    def call(self, fn, *args):
+        """Runs fn(*args) on the Tk thread; safe to call from any thread."""
+        self._calls.put((fn, args))
+        try:
+            self.root.event_generate("<<GameCall>>", when="tail")
+        except (RuntimeError, self.tk.TclError):
+            # The window is gone; there is nobody left to show it to.
+            pass
+
+    def _drain(self, event):
+        while True:
+            try:
+                fn, args = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            fn(*args)
+
+    def key(self, event):
+        if event.keysym == "Escape":
+            return
+        if self._accepting:
+            self.press_time = clock.now()
+            self._accepting = False
+            self.pressed.set()
+        elif self.on_restart is not None and event.keysym == "space":
+            restart, self.on_restart = self.on_restart, None
+            restart()
+
+    def image(self, ngram):
+        """The PhotoImage for ngram, built on first use; None if no pack."""
+        if ngram not in self.images:
+            picture = self.letters.compose(ngram, self.style) if self.letters else None
+            if picture is not None:
+                picture = self.tk.PhotoImage(data=_pgm(picture)).zoom(self.scale)
+            self.images[ngram] = picture
+        return self.images[ngram]
+
+    def show(self, ngram, status, players):
+        picture = self.image(ngram)
+        if picture is not None:
+            self.letters_label.configure(image=picture, text="")
+        else:
+            self.letters_label.configure(image="", text=ngram.upper(), font=LETTER_FONT)
+        self.status.configure(text=status)
+        self.show_lives(players)
+
+    def show_lives(self, players, turn=None):
+        self.lives.configure(text="   ".join(
+            ("> " if i == turn else "  ") + f"P{i + 1} " + ("*" * p if p else "out")
+            for i, p in enumerate(players)))
+
+    def turn_started(self, turn, players, seconds):
+        self.show_lives(players, turn)
+        self.root.configure(background="black")
+        self._deadline = clock.now() + seconds
+        self._accepting = True
+        self._tick()
+
+    def _tick(self):
+        remaining = self._deadline - clock.now()
+        if not self._accepting or remaining <= 0:
+            self._countdown = None
+            return
+        self.timer.configure(text=f"{remaining:.1f}s")
+        self._countdown = self.root.after(COUNTDOWN_MS, self._tick)
+
+    def turn_finished(self, reaction, players, life_lost):
+        self._accepting = False
+        if self._countdown is not None:
+            self.root.after_cancel(self._countdown)
+            self._countdown = None
+        if life_lost:
+            self.timer.configure(text="Time!")
+            self.letters_label.configure(bg="darkred")
+            self.root.after(200, lambda: self.letters_label.configure(bg="black"))
+        else:
+            self.timer.configure(text=f"{reaction * 1000:.0f} ms")
+        self.show_lives(players)
+
+    def game_over(self, players, winner, restart):
+        if winner is not None:
+            text = f"Player {winner + 1} wins!"
+        else:
+            text = "No players remain."
+        self.letters_label.configure(image="", text=text, font=("Helvetica", 40, "bold"))
+        self.status.configure(text="Space: play again   Escape: quit")
+        self.timer.configure(text="")
+        self.show_lives(players)
+        self.on_restart = restart
+
+###############################################################################
+# FRONTEND (game thread)
+###############################################################################
+class TkFrontend(engine.Frontend):
+    """Runs the engine against a DesktopView, keyboard as the button."""
+
+    def __init__(self, view, restart):
+        self.view = view
+        self.restart = restart
+
+    def round_started(self, state, ngram, loss_ratio):
+        kind = "TRIGRAM" if state.use_trigrams else "BIGRAM"
+        self.view.call(self.view.show, ngram,
+                       f"Round {state.round}: {kind}, {state.round_time:.2f}s per turn, "
+                       f"{state.alive()} players left", list(state.players))
+
+    def round_resumed(self, state, ngram):
+        self.round_started(state, ngram, 0.0)
+
+    def play_turn(self, state, ngram):
+        self.view.pressed.clear()
+        turn_start = clock.now()
+        self.view.call(self.view.turn_started, state.turn, list(state.players),
+                       state.round_time)
+        if clock.wait(self.view.pressed, state.round_time):
+            return max(0.0, self.view.press_time - turn_start)
+        return None
+
+    def turn_finished(self, state, ngram, reaction, life_lost):
+        self.view.call(self.view.turn_finished, reaction, list(state.players), life_lost)
+
+    def game_over(self, state):
+        self.view.call(self.view.game_over, list(state.players), state.roster.winner(),
+                       self.restart)
+
+###############################################################################
+# MAIN
+###############################################################################
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("players", nargs="?", type=int, default=5)
+    parser.add_argument("round_time", nargs="?", type=float, default=5)
+    parser.add_argument("lives", nargs="?", type=int, default=3)
+    parser.add_argument("--style", help="letter pack style (see fontbuild.py)")
+    parser.add_argument("--scale", type=int, default=4, help="zoom for the letter images")
+    args = parser.parse_args()
+
+    import tkinter
+
+    bigrams, trigrams = load_ngrams()
+    root = tkinter.Tk()
+    view = DesktopView(root, open_letters(), args.style, args.scale)
+
+    def start():
+        state = gamestate.GameState(args.players, args.round_time, args.lives)
+        frontend = TkFrontend(view, start)
+        threading.Thread(target=engine.run_game, args=(state, bigrams, trigrams, frontend),
+                         name="game", daemon=True).start()
+
+    start()
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# dither.py
+"""
+Image import for splash and title screens.
+
+pack_image() is meant for letter art that is already black and white: it
+converts to 1 bit before resizing, so photos and shaded art come out
+blotchy, and it runs every time the image is shown. load() instead
+
+  1. scales the greyscale image down to fit the panel with a Lanczos filter,
+  2. cuts it to 1 bit with the chosen algorithm, over the whole frame at
+     once inside PIL (no per-pixel Python):
+       threshold  plain cut at a grey level
+       bayer      8x8 ordered dither: stable pattern, good for flat shading
+       floyd      Floyd-Steinberg error diffusion: best for photos
+  3. packs it for the SH1106 and caches the 1024-byte frame under a hash of
+     the source file and the settings,
+
+so showing the screen later is a file read.
+
+    frame = dither.load("splash.png", "bayer", lit_white=True)
+    panel.write_frame(frame)
+
+Run it to preview a conversion as text: python3 dither.py art.png floyd
+"""
+
+import hashlib
+import os
+import sys
+
+import sh1106
+
+CACHE_DIR = "frames.cache"
+ALGORITHMS = ("threshold", "bayer", "floyd")
+# Bump when the conversion changes, so stale cached frames are not reused.
+CACHE_VERSION = 1
+
+###############################################################################
+# DITHERING
+###############################################################################
+def bayer_matrix(order=3):
+    """The 2^order square Bayer index matrix, as a list of rows."""
+    m = [[0]]
+    for _ in range(order):
+        m = ([[4 * v for v in row] + [4 * v + 2 for v in row] for row in m] +
+             [[4 * v + 3 for v in row] + [4 * v + 1 for v in row] for row in m])
+    return m
+
+_thresholds = {}
+
+def _threshold_map(size):
+    """A greyscale image of tiled Bayer thresholds covering size."""
+    if size not in _thresholds:
+        from PIL import Image
+
+        m = bayer_matrix()
+        n = len(m)
+        levels = bytes(int((v + 0.5) * 256 / (n * n)) for row in m for v in row)
+        tile = Image.frombytes("L", (n, n), levels)
+        full = Image.new("L", size)
+        for y in range(0, size[1], n):
+            for x in range(0, size[0], n):
+                full.paste(tile, (x, y))
+        _thresholds[size] = full
+    return _thresholds[size]
+
+def to_1bit(grey, algorithm="floyd", threshold=128):
+    """Cuts an "L" image to mode "1" (1 = white)."""
+    from PIL import ImageChops
+
+    if algorithm == "floyd":
+        return grey.convert("1")
+    if algorithm == "bayer":
+        # Lit wherever the pixel is brighter than its cell's threshold:
+        # subtract clamps at 0, so anything left over is above it.
+        grey = ImageChops.subtract(grey, _threshold_map(grey.size))
+        threshold = 1
+    elif algorithm != "threshold":
+        raise ValueError(f"unknown dithering algorithm {algorithm!r}")
+    return grey.point(lambda v: 255 if v >= threshold else 0).convert("1", dither=0)
+
+def fit(image, background=0, size=(sh1106.WIDTH, sh1106.HEIGHT)):
+    """Greyscale copy scaled to fit size, centred on background."""
+    from PIL import Image
+
+    grey = image.convert("L")
+    scale = min(size[0] / grey.width, size[1] / grey.height)
+    scaled = grey.resize((max(1, round(grey.width * scale)), max(1, round(grey.height * scale))),
+                         getattr(Image, "Resampling", Image).LANCZOS)
+    canvas = Image.new("L", size, background)
+    canvas.paste(scaled, ((size[0] - scaled.width) // 2, (size[1] - scaled.height) // 2))
+    return canvas
+
+def convert(image, algorithm="floyd", rotate=False, lit_white=False, threshold=128):
+    """A PIL image to a packed SH1106 frame: scale, dither, pack."""
+    # Letterbox bars in the colour that stays dark on the panel.
+    grey = fit(image, background=0 if lit_white else 255)
+    return sh1106.pack_image(to_1bit(grey, algorithm, threshold), rotate, lit_white)
+
+###############################################################################
+# CACHED LOADING
+###############################################################################
+def cache_key(data, algorithm, rotate, lit_white, threshold):
+    h = hashlib.sha256(data)
+    h.update(f"|{CACHE_VERSION}|{algorithm}|{rotate:d}|{lit_white:d}|{threshold}".encode())
+    return h.hexdigest()[:32]
+
+def load(path, algorithm="floyd", rotate=False, lit_white=False, threshold=128,
+         cache_dir=CACHE_DIR):
+    """The packed frame for an image file, converted at most once."""
+    with open(path, "rb") as f:
+        data = f.read()
+    cached = os.path.join(cache_dir, cache_key(data, algorithm, rotate, lit_white, threshold))
+    try:
+        with open(cached, "rb") as f:
+            frame = f.read()
+        if len(frame) == sh1106.FRAME_SIZE:
+            return frame
+    except FileNotFoundError:
+        pass
+
+    import io
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        frame = convert(image, algorithm, rotate, lit_white, threshold)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = cached + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(frame)
+    os.replace(tmp, cached)
+    return frame
+
+###############################################################################
+# PREVIEW
+###############################################################################
+def preview(frame):
+    """Text rendering of a packed frame (lit pixels drawn), two rows per line."""
+    rows = []
+    for y in range(0, sh1106.HEIGHT, 2):
+        line = []
+        for x in range(sh1106.WIDTH):
+            top = frame[(y // 8) * sh1106.WIDTH + x] >> (y % 8) & 1
+            bottom = frame[((y + 1) // 8) * sh1106.WIDTH + x] >> ((y + 1) % 8) & 1
+            line.append(" ▀▄█"[top | bottom << 1])
+        rows.append("".join(line))
+    return "\n".join(rows)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python3 dither.py IMAGE [threshold|bayer|floyd]")
+    algorithm = sys.argv[2] if len(sys.argv) > 2 else "floyd"
+    print(preview(load(sys.argv[1], algorithm, lit_white=True)))
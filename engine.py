@@ -0,0 +1,62 @@
+# engine.py
+"""
+Hardware-independent game loop.
+
+run_game() drives a gamestate.GameState from set-up to game over and calls
+out to a Frontend for everything that touches the outside world: showing the
+n-gram, timing a turn, sounds, logging. returner6.py plugs in the OLED,
+button and speaker; simulate.py plugs in synthetic players on virtual time.
+"""
+
+import gamestate
+
+class Frontend:
+    """Hooks called by run_game(). Only play_turn() has to be provided."""
+
+    def pick(self, state):
+        """Optional n-gram picker for GameState.draw_ngram()."""
+        return None
+
+    def round_started(self, state, ngram, loss_ratio):
+        pass
+
+    def round_resumed(self, state, ngram):
+        pass
+
+    def play_turn(self, state, ngram):
+        """
+        Runs the current player's turn (state.turn) and returns their
+        reaction time in seconds, or None if the timer ran out.
+        """
+        raise NotImplementedError
+
+    def turn_finished(self, state, ngram, reaction, life_lost):
+        pass
+
+    def round_finished(self, state):
+        pass
+
+    def game_over(self, state):
+        pass
+
+def run_game(state, bigrams, trigrams, frontend):
+    """Plays (or resumes) the game in state to the end and returns it."""
+    while True:
+        if state.phase in (gamestate.SETUP, gamestate.ROUND_END):
+            if state.end_round():
+                break
+            loss_ratio = state.start_round()
+            ngram = state.draw_ngram(bigrams, trigrams, frontend.pick(state))
+            frontend.round_started(state, ngram, loss_ratio)
+        else:
+            ngram = state.current_ngram(bigrams, trigrams)
+            frontend.round_resumed(state, ngram)
+
+        while state.next_turn() is not None:
+            reaction = frontend.play_turn(state, ngram)
+            life_lost = state.record_turn(reaction is not None)
+            frontend.turn_finished(state, ngram, reaction, life_lost)
+        frontend.round_finished(state)
+
+    frontend.game_over(state)
+    return state
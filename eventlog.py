@@ -0,0 +1,172 @@
+# eventlog.py
+"""
+Append-only binary log of game events.
+
+Every event is one fixed-size record, so the log can be appended to,
+rotated and read back without any parsing state:
+
+    time (float64 wall clock), kind, player, lives, value, n-gram
+
+log() only packs the record into an in-memory buffer; a background thread
+writes the buffer out every flush_interval seconds and fsyncs at most every
+sync_interval seconds, so the game's timer thread never waits on the SD card.
+
+Run this module to dump logs and print per-player statistics:
+
+    python3 eventlog.py events.log events.log.1
+"""
+
+import os
+import struct
+import sys
+import threading
+import time
+
+LOG_PATH = "events.log"
+
+GAME_START, NGRAM_SHOWN, PRESS, TIMEOUT, LIFE_LOST, GAME_END = range(1, 7)
+KIND_NAMES = {
+    GAME_START: "game_start",
+    NGRAM_SHOWN: "ngram_shown",
+    PRESS: "press",
+    TIMEOUT: "timeout",
+    LIFE_LOST: "life_lost",
+    GAME_END: "game_end",
+}
+
+NO_PLAYER = 0xFF
+
+MAGIC = b"NGEV"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+RECORD = struct.Struct("<dBBhi4s")
+
+def _header():
+    return HEADER.pack(MAGIC, VERSION, RECORD.size)
+
+###############################################################################
+# WRITER
+###############################################################################
+class EventLog:
+
+    def __init__(self, path=LOG_PATH, max_bytes=1 << 20, keep=4,
+                 flush_interval=1.0, sync_interval=10.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.flush_interval = flush_interval
+        self.sync_interval = sync_interval
+        self._buf = bytearray()
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._fd = None
+        self._size = 0
+        self._last_sync = time.monotonic()
+        self._open()
+        self._thread = threading.Thread(target=self._run, name="eventlog", daemon=True)
+        self._thread.start()
+
+    def log(self, kind, player=NO_PLAYER, lives=0, value=0, ngram=""):
+        record = RECORD.pack(time.time(), kind, player, lives, value,
+                             ngram.encode("ascii", "replace")[:4])
+        with self._lock:
+            self._buf += record
+
+    def flush(self, sync=False):
+        """Writes buffered records out; fsyncs them too if sync is set."""
+        with self._lock:
+            data = bytes(self._buf)
+            self._buf.clear()
+        with self._io_lock:
+            if data:
+                if self._size > HEADER.size and self._size + len(data) > self.max_bytes:
+                    self._rotate()
+                os.write(self._fd, data)
+                self._size += len(data)
+            now = time.monotonic()
+            if sync or now - self._last_sync >= self.sync_interval:
+                os.fsync(self._fd)
+                self._last_sync = now
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush(sync=True)
+        os.close(self._fd)
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._size = os.fstat(self._fd).st_size
+        if self._size == 0:
+            os.write(self._fd, _header())
+            self._size = HEADER.size
+
+    def _rotate(self):
+        os.fsync(self._fd)
+        os.close(self._fd)
+        for i in range(self.keep - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        os.replace(self.path, self.path + ".1")
+        self._open()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print("Event log write failed:", e)
+
+###############################################################################
+# READER
+###############################################################################
+def read_events(path):
+    """Yields (time, kind, player, lives, value, ngram) tuples from a log."""
+    with open(path, "rb") as f:
+        magic, version, size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or size != RECORD.size:
+            raise ValueError(f"{path} is not an event log")
+        while True:
+            chunk = f.read(size * 512)
+            # A partial record at the end is a write cut short; skip it.
+            usable = len(chunk) - len(chunk) % size
+            for t, kind, player, lives, value, ngram in RECORD.iter_unpack(chunk[:usable]):
+                yield t, kind, player, lives, value, ngram.rstrip(b"\0").decode("ascii")
+            if len(chunk) < size * 512:
+                return
+
+def summarize(events):
+    games = 0
+    presses = {}
+    timeouts = {}
+    for t, kind, player, lives, value, ngram in events:
+        if kind == GAME_START:
+            games += 1
+        elif kind == PRESS:
+            presses.setdefault(player, []).append(value)
+        elif kind == TIMEOUT:
+            timeouts[player] = timeouts.get(player, 0) + 1
+    print(f"Games: {games}")
+    for player in sorted(set(presses) | set(timeouts)):
+        times = presses.get(player, [])
+        mean = sum(times) / len(times) if times else 0
+        print(f"Player {player + 1}: {len(times)} presses, mean reaction "
+              f"{mean:.0f} ms, {timeouts.get(player, 0)} timeouts")
+
+def main(paths):
+    events = []
+    for path in paths:
+        for event in read_events(path):
+            t, kind, player, lives, value, ngram = event
+            who = "-" if player == NO_PLAYER else player + 1
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))} "
+                  f"{KIND_NAMES.get(kind, kind):12} player={who} lives={lives} "
+                  f"value={value} ngram={ngram}")
+            events.append(event)
+    events.sort()
+    summarize(events)
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or [LOG_PATH])
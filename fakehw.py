@@ -0,0 +1,229 @@
+# fakehw.py
+"""
+Stand-ins for RPi.GPIO, spidev and pygame, so the launcher and the game run
+unchanged on a machine without the hardware.
+
+    board = fakehw.install()
+    import menu_launcher           # picks up the fakes from sys.modules
+    board.press("A")
+
+A Board is the shared wiring: button presses reach every GPIO module that
+has an edge callback on the pin, the way two processes on the Pi both see
+the same button. It also counts what is currently open (SPI handles, edge
+callbacks, mixer inits, live sounds), so soak.py can spot resources that
+are never given back.
+"""
+
+import os
+import sys
+import threading
+import types
+import weakref
+
+from buttons import BUTTONS
+
+class Board:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Weak, so a finished game's GPIO module can go away with the game.
+        self._gpios = weakref.WeakSet()
+        self.spi_open = 0
+        self.mixer_inits = 0
+        self.sounds_live = 0
+        self.frames_written = 0
+
+    def gpio(self):
+        """A fresh RPi.GPIO module wired to this board, as a new process sees it."""
+        gpio = FakeGPIO(self)
+        with self._lock:
+            self._gpios.add(gpio)
+        return gpio
+
+    def press(self, label):
+        pin = BUTTONS[label]
+        with self._lock:
+            callbacks = [cb for g in self._gpios for cb in g._detects.get(pin, ())]
+        for callback in callbacks:
+            callback(pin)
+
+    def edge_callbacks(self):
+        with self._lock:
+            return sum(len(cbs) for g in self._gpios for cbs in g._detects.values())
+
+    def counts(self):
+        return {
+            "spi_open": self.spi_open,
+            "edge_callbacks": self.edge_callbacks(),
+            "mixer_inits": self.mixer_inits,
+            "sounds_live": self.sounds_live,
+        }
+
+###############################################################################
+# RPi.GPIO
+###############################################################################
+class FakeGPIO(types.ModuleType):
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    HIGH = 1
+    LOW = 0
+    PUD_UP = 22
+    PUD_DOWN = 21
+    FALLING = 32
+    RISING = 31
+    BOTH = 33
+
+    def __init__(self, board):
+        super().__init__("RPi.GPIO")
+        self.board = board
+        self._mode = None
+        self._levels = {}
+        self._detects = {}
+
+    def setwarnings(self, on):
+        pass
+
+    def setmode(self, mode):
+        self._mode = mode
+
+    def getmode(self):
+        return self._mode
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        self._levels[pin] = self.HIGH if initial is None else initial
+
+    def output(self, pin, value):
+        self._levels[pin] = value
+
+    def input(self, pin):
+        return self._levels.get(pin, self.HIGH)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        if pin in self._detects:
+            raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+        with self.board._lock:
+            # Back on the board after a cleanup(), like a re-requested line.
+            self.board._gpios.add(self)
+            self._detects[pin] = [callback] if callback else []
+
+    def remove_event_detect(self, pin):
+        with self.board._lock:
+            self._detects.pop(pin, None)
+
+    def cleanup(self):
+        with self.board._lock:
+            self._detects.clear()
+            self.board._gpios.discard(self)
+        self._levels.clear()
+
+###############################################################################
+# spidev
+###############################################################################
+class FakeSpiDev:
+    """Holds a real descriptor while open, so a missed close() shows as an fd leak."""
+
+    def __init__(self, board):
+        self.board = board
+        self.max_speed_hz = 0
+        self.mode = 0
+        self._fd = None
+
+    def open(self, bus, device):
+        self._fd = os.open(os.devnull, os.O_WRONLY)
+        self.board.spi_open += 1
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self.board.spi_open -= 1
+
+    def xfer(self, data):
+        if len(data) >= 128:
+            self.board.frames_written += 1
+        return [0] * len(data)
+
+    xfer2 = xfer
+    writebytes = xfer
+    writebytes2 = xfer
+
+###############################################################################
+# pygame.mixer
+###############################################################################
+class FakeChannel:
+    def stop(self):
+        pass
+
+class FakeMixer(types.ModuleType):
+
+    def __init__(self, board):
+        super().__init__("pygame.mixer")
+        self.board = board
+        self._init = False
+        mixer = self
+
+        class Sound:
+            def __init__(self, path):
+                mixer._count(1)
+                with open(path, "rb"):
+                    pass
+
+            def __del__(self):
+                mixer._count(-1)
+
+            def play(self):
+                return FakeChannel()
+
+        self.Sound = Sound
+
+    def _count(self, delta):
+        with self.board._lock:
+            self.board.sounds_live += delta
+
+    def init(self, *args, **kwargs):
+        if not self._init:
+            self._init = True
+            self.board.mixer_inits += 1
+
+    def get_init(self):
+        return self._init
+
+    def quit(self):
+        if self._init:
+            self._init = False
+            self.board.mixer_inits -= 1
+
+    def find_channel(self, force=False):
+        return FakeChannel()
+
+###############################################################################
+# INSTALL
+###############################################################################
+def use_gpio(gpio):
+    """Makes `import RPi.GPIO` return gpio from now on."""
+    sys.modules["RPi"].GPIO = gpio
+    sys.modules["RPi.GPIO"] = gpio
+
+def install(board=None):
+    """Puts the fakes in sys.modules and returns their Board."""
+    board = board or Board()
+
+    rpi = types.ModuleType("RPi")
+    sys.modules["RPi"] = rpi
+    use_gpio(board.gpio())
+    # Keep gpio_backend on the fake RPi.GPIO even where gpiod is installed.
+    sys.modules["gpiod"] = None
+
+    spidev = types.ModuleType("spidev")
+    spidev.SpiDev = lambda: FakeSpiDev(board)
+    sys.modules["spidev"] = spidev
+
+    pygame = types.ModuleType("pygame")
+    pygame.mixer = FakeMixer(board)
+    pygame.init = lambda: (0, 0)
+    pygame.quit = pygame.mixer.quit
+    sys.modules["pygame"] = pygame
+    sys.modules["pygame.mixer"] = pygame.mixer
+    return board
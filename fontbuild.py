@@ -0,0 +1,111 @@
+# fontbuild.py
+"""
+Build-time font rasterizer for the letter pack.
+
+Renders A-Z from any local TTF/OTF straight into letters.pack (see
+assetpack.py) at the cell sizes the display layouts use, so a new letter
+style is one command and the game never loads a font or decodes a JPEG:
+
+    python3 fontbuild.py /usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf \\
+        --name dejavu --dither threshold --threshold 110
+
+Each style gets a bigram variant (two 64x64 cells fill the 128x64 panel)
+stored as NAME, and a trigram variant (three 42x64 cells) stored as NAME/3,
+so trigrams are no longer squashed by the resize in pack_image(). Existing
+styles in the pack are kept; one with the same name is replaced.
+
+Glyphs are drawn at 4x in greyscale, scaled down with a Lanczos filter and
+then cut to 1 bit, either with a plain threshold (crisp strokes, the best
+choice for bold fonts) or with Floyd-Steinberg dithering (keeps thin
+strokes and antialiasing visible as texture).
+"""
+
+import argparse
+import os
+
+from PIL import Image, ImageDraw, ImageFont
+
+import assetpack
+import sh1106
+
+# N-gram length -> (cell width, cell height); None keeps the plain style name.
+LAYOUTS = {
+    None: (sh1106.WIDTH // 2, sh1106.HEIGHT),
+    3: (sh1106.WIDTH // 3, sh1106.HEIGHT),
+}
+
+SUPERSAMPLE = 4
+MARGIN = 4
+PROBE_SIZE = 200
+
+###############################################################################
+# RASTERIZING
+###############################################################################
+def fit_size(font_path, charset, cell):
+    """Largest font size whose every letter fits in cell minus the margin."""
+    font = ImageFont.truetype(font_path, PROBE_SIZE)
+    widest = tallest = 1
+    for ch in charset:
+        left, top, right, bottom = font.getbbox(ch)
+        widest = max(widest, right - left)
+        tallest = max(tallest, bottom - top)
+    width, height = cell
+    scale = min((width - 2 * MARGIN) / widest, (height - 2 * MARGIN) / tallest)
+    return max(1, int(PROBE_SIZE * scale * SUPERSAMPLE))
+
+def render_glyph(font, ch, cell):
+    """Black letter on white, centred by its ink box, in a greyscale cell."""
+    width, height = cell
+    big = Image.new("L", (width * SUPERSAMPLE, height * SUPERSAMPLE), 255)
+    left, top, right, bottom = font.getbbox(ch)
+    x = (big.width - (right - left)) // 2 - left
+    y = (big.height - (bottom - top)) // 2 - top
+    ImageDraw.Draw(big).text((x, y), ch, font=font, fill=0)
+    return big.resize(cell, getattr(Image, "Resampling", Image).LANCZOS)
+
+def to_bitmap(grey, dither, threshold):
+    if dither == "floyd":
+        return grey.convert("1")
+    return grey.point(lambda v: 255 if v >= threshold else 0).convert("1", dither=0)
+
+def rasterize(font_path, cell, dither="threshold", threshold=128,
+              charset=assetpack.CHARSET):
+    """Returns {char: 1-bit image} for charset drawn into cell."""
+    font = ImageFont.truetype(font_path, fit_size(font_path, charset, cell))
+    return {ch: to_bitmap(render_glyph(font, ch, cell), dither, threshold)
+            for ch in charset}
+
+###############################################################################
+# PACKING
+###############################################################################
+def add_font(pack_path, font_path, name, dither="threshold", threshold=128):
+    """
+    Rasterizes the font for every layout into the pack, keeping its other
+    styles, and returns the number of glyphs written.
+    """
+    styles = assetpack.read_styles(pack_path) if os.path.exists(pack_path) else []
+    built = []
+    for length, cell in LAYOUTS.items():
+        style = name if length is None else f"{name}/{length}"
+        built.append((style, rasterize(font_path, cell, dither, threshold)))
+    replaced = {style for style, _ in built}
+    styles = [s for s in styles if s[0] not in replaced] + built
+    return assetpack.write_pack(pack_path, styles)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("font", help="path to a .ttf or .otf file")
+    parser.add_argument("--name", help="style name (default: the font's file name)")
+    parser.add_argument("--pack", default=assetpack.PACK_PATH)
+    parser.add_argument("--dither", choices=("threshold", "floyd"), default="threshold")
+    parser.add_argument("--threshold", type=int, default=128,
+                        help="grey level (0-255) at or above which a pixel is background")
+    args = parser.parse_args()
+
+    name = args.name or os.path.splitext(os.path.basename(args.font))[0][:12]
+    count = add_font(args.pack, args.font, name, args.dither, args.threshold)
+    print(f"Wrote style {name!r} ({', '.join(f'{w}x{h}' for w, h in LAYOUTS.values())} "
+          f"cells), {count} glyphs now in {args.pack}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+# gamestate.py
+"""
+Explicit game state machine with compact on-disk snapshots.
+
+The state is everything needed to pick a game back up exactly where it
+stopped: lives per player, whose turn it is, the round number and timing,
+and the position in the shuffled n-gram decks. It is saved after every turn
+so a crashed or power-cycled game can be resumed by the launcher.
+
+Phases:  SETUP -> ROUND -> TURN ... -> ROUND_END -> ROUND ... -> GAME_OVER
+(a game set up with fewer than two players goes straight to GAME_OVER).
+
+Players are a Roster: seat numbers (player IDs) never change when someone
+is knocked out, so scores, stats and per-player buttons can be keyed by
+them, and moving from one turn to the next is O(1).
+"""
+
+import os
+import random
+import struct
+import zlib
+
+SNAPSHOT_PATH = "game.snapshot"
+
+SETUP, ROUND, TURN, ROUND_END, GAME_OVER = range(5)
+PHASE_NAMES = ("SETUP", "ROUND", "TURN", "ROUND_END", "GAME_OVER")
+
+TRANSITIONS = {
+    SETUP: (ROUND, GAME_OVER),
+    ROUND: (TURN, ROUND_END),
+    TURN: (TURN, ROUND_END),
+    ROUND_END: (ROUND, GAME_OVER),
+    GAME_OVER: (),
+}
+
+LOSS_THRESHOLD = 0.6
+# Round time is base * (players left / players)^TIME_SCALING.
+TIME_SCALING = 1.0
+
+class Roster:
+    """
+    Lives per player ID, with the players still in kept as a linked list
+    in seat order (next/prev arrays). Knocking a player out unlinks them in
+    O(1). next_alive() is O(1) from a player still in and from the one just
+    knocked out, which is how turns advance. A player knocked out earlier
+    keeps the link they had when unlinked, which may lead through others
+    knocked out since; next_alive() follows that chain once and then
+    shortens it. The IDs knocked out are kept in elimination order.
+    """
+
+    def __init__(self, lives):
+        self.lives = list(lives)
+        self.rebuild()
+
+    def rebuild(self, eliminated=None):
+        """Recomputes the links from lives (after a restore)."""
+        count = len(self.lives)
+        alive = [i for i in range(count) if self.lives[i] > 0]
+        # Index count is the sentinel that heads the list.
+        self._next = [count] * (count + 1)
+        self._prev = [count] * (count + 1)
+        last = count
+        for i in alive:
+            self._next[last] = i
+            self._prev[i] = last
+            last = i
+        self._next[last] = count
+        self._prev[count] = last
+        # Players already out point at the next one still in, as if they
+        # had been unlinked (a snapshot can be taken right after a turn).
+        following = count
+        for i in reversed(range(count)):
+            if self.lives[i] > 0:
+                following = i
+            else:
+                self._next[i] = following
+        self.alive_count = len(alive)
+        out = [i for i in range(count) if self.lives[i] <= 0]
+        if eliminated is None or sorted(eliminated) != out:
+            eliminated = out
+        self.eliminated = list(eliminated)
+
+    def __len__(self):
+        return len(self.lives)
+
+    def is_alive(self, player):
+        return self.lives[player] > 0
+
+    def next_alive(self, player=None):
+        """The first player still in after seat player (from the start if None)."""
+        count = len(self.lives)
+        if player is None:
+            following = self._next[count]
+        elif self.lives[player] > 0:
+            following = self._next[player]
+        else:
+            # A player knocked out keeps the link they had; if that player
+            # is out too, walk on and point them past the chain.
+            following = self._next[player]
+            while following != count and self.lives[following] <= 0:
+                following = self._next[following]
+            self._next[player] = following
+        return None if following == count else following
+
+    def alive_ids(self):
+        """The players still in, in seat order."""
+        count = len(self.lives)
+        player = self._next[count]
+        while player != count:
+            yield player
+            player = self._next[player]
+
+    def lose_life(self, player):
+        """Takes a life from player; True if that knocked them out."""
+        self.lives[player] -= 1
+        if self.lives[player] > 0:
+            return False
+        self._next[self._prev[player]] = self._next[player]
+        self._prev[self._next[player]] = self._prev[player]
+        self.alive_count -= 1
+        self.eliminated.append(player)
+        return True
+
+    def winner(self):
+        """The last player standing, or None."""
+        return self.next_alive() if self.alive_count == 1 else None
+
+class GameState:
+
+    def __init__(self, player_count, round_time, lives, seed=None,
+                 loss_threshold=LOSS_THRESHOLD, time_scaling=TIME_SCALING):
+        self.player_count = player_count
+        self.base_round_time = float(round_time)
+        self.start_lives = lives
+        self.roster = Roster([lives] * player_count)
+        self.phase = SETUP
+        self.round = 0
+        self.turn = -1
+        self.round_time = float(round_time)
+        self.use_trigrams = False
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.bi_pos = 0
+        self.tri_pos = 0
+        self.ngram_index = 0
+        # Tuning knobs (see simulate.py); not part of the snapshot.
+        self.loss_threshold = loss_threshold
+        self.time_scaling = time_scaling
+        self._decks = {}
+        # Which of the next `window` cards each draw took, per deck, so a
+        # resumed game can redo the picker's swaps (see draw_ngram()).
+        self.picks = {"bi": bytearray(), "tri": bytearray()}
+
+    ###########################################################################
+    # TRANSITIONS
+    ###########################################################################
+    def _goto(self, phase):
+        if phase not in TRANSITIONS[self.phase]:
+            raise ValueError(f"Illegal transition {PHASE_NAMES[self.phase]}"
+                             f" -> {PHASE_NAMES[phase]}")
+        self.phase = phase
+
+    @property
+    def players(self):
+        """Lives per player ID, as a tuple: changes go through the roster."""
+        return tuple(self.roster.lives)
+
+    def alive(self):
+        return self.roster.alive_count
+
+    def start_round(self):
+        """Works out this round's difficulty and moves to ROUND."""
+        self._goto(ROUND)
+        remaining = self.alive()
+        loss_ratio = (self.player_count - remaining) / self.player_count
+        self.use_trigrams = loss_ratio >= self.loss_threshold or remaining == 3
+        self.round_time = (self.base_round_time
+                           * (remaining / self.player_count) ** self.time_scaling)
+        self.round += 1
+        self.turn = -1
+        return loss_ratio
+
+    def next_turn(self):
+        """
+        Advances to the next living player's turn and returns their index,
+        or None (and ROUND_END) once everybody has played this round.
+        """
+        player = self.roster.next_alive(self.turn if self.turn >= 0 else None)
+        if player is not None:
+            self._goto(TURN)
+            self.turn = player
+            return player
+        self._goto(ROUND_END)
+        self.turn = self.player_count
+        return None
+
+    def record_turn(self, pressed):
+        """Applies the outcome of the current turn; True if a life was lost."""
+        if self.phase != TURN:
+            raise ValueError("No turn in progress")
+        if pressed:
+            return False
+        self.roster.lose_life(self.turn)
+        return True
+
+    def end_round(self):
+        """Finishes the game once at most one player is left."""
+        if self.alive() > 1:
+            return False
+        self._goto(GAME_OVER)
+        return True
+
+    ###########################################################################
+    # N-GRAM DECKS
+    ###########################################################################
+    def _deck(self, name, size):
+        # Decks are a fixed shuffle derived from the seed, with the picker's
+        # swaps redone on top, so the seed and the picks are all a snapshot
+        # needs to replay the same n-grams.
+        deck = self._decks.get(name)
+        if deck is None or len(deck) != size:
+            deck = list(range(size))
+            random.Random(f"{self.seed}:{name}").shuffle(deck)
+            for pos, offset in enumerate(self.picks[name]):
+                first = pos % size
+                chosen = (first + offset) % size
+                deck[first], deck[chosen] = deck[chosen], deck[first]
+            self._decks[name] = deck
+        return deck
+
+    def draw_ngram(self, bigrams, trigrams, pick=None, window=8):
+        """
+        Draws the next n-gram for this round from the right deck.
+
+        pick, if given, chooses among the next `window` cards of the deck
+        (see analytics.Analytics.picker) and the chosen card is swapped to
+        the front.
+        """
+        name, ngrams = ("tri", trigrams) if self.use_trigrams else ("bi", bigrams)
+        deck = self._deck(name, len(ngrams))
+        pos = self.tri_pos if self.use_trigrams else self.bi_pos
+        first = pos % len(deck)
+        offset = 0
+        if pick is not None:
+            slots = [(first + j) % len(deck) for j in range(min(window, len(deck)))]
+            offset = pick([ngrams[deck[i]] for i in slots])
+            chosen = slots[offset]
+            deck[first], deck[chosen] = deck[chosen], deck[first]
+        self.picks[name].append(offset)
+        if self.use_trigrams:
+            self.tri_pos += 1
+        else:
+            self.bi_pos += 1
+        self.ngram_index = deck[first]
+        return ngrams[self.ngram_index]
+
+    def current_ngram(self, bigrams, trigrams):
+        """The n-gram drawn for the round in progress (used after a resume)."""
+        return (trigrams if self.use_trigrams else bigrams)[self.ngram_index]
+
+    ###########################################################################
+    # SNAPSHOTS
+    ###########################################################################
+    # magic, phase, player count, starting lives, use trigrams, round, turn,
+    # seed, bigram deck pos, trigram deck pos, current n-gram index, base
+    # round time, round time, then one byte of lives per player, the IDs of
+    # the players out in elimination order, the picked offset of every
+    # bigram then every trigram draw, and a CRC32 of everything before it.
+    # NGS3 (no picks) and NGS2 (no elimination order either) still load,
+    # as if every draw had taken the top card.
+    _HEADER = struct.Struct("<4sBBBBHhIIIHff")
+    _MAGIC = b"NGS4"
+    _OLD_MAGICS = (b"NGS2", b"NGS3")
+
+    def to_bytes(self):
+        body = self._HEADER.pack(
+            self._MAGIC, self.phase, self.player_count, self.start_lives,
+            self.use_trigrams, self.round, self.turn, self.seed,
+            self.bi_pos, self.tri_pos, self.ngram_index,
+            self.base_round_time, self.round_time,
+        ) + (bytes(self.roster.lives) + bytes(self.roster.eliminated)
+             + self.picks["bi"] + self.picks["tri"])
+        return body + struct.pack("<I", zlib.crc32(body))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuilds a state from a snapshot; raises ValueError if corrupt."""
+        size = cls._HEADER.size
+        if len(data) < size + 4:
+            raise ValueError("Snapshot too short")
+        body, (crc,) = data[:-4], struct.unpack("<I", data[-4:])
+        if zlib.crc32(body) != crc:
+            raise ValueError("Snapshot checksum mismatch")
+        (magic, phase, player_count, start_lives, use_trigrams, round_no,
+         turn, seed, bi_pos, tri_pos, ngram_index, base_round_time,
+         round_time) = cls._HEADER.unpack(body[:size])
+        if magic != cls._MAGIC and magic not in cls._OLD_MAGICS:
+            raise ValueError("Not a game snapshot")
+        lives = list(body[size:size + player_count])
+        pos = size + player_count
+        eliminated = picks = None
+        if magic != b"NGS2":
+            eliminated = list(body[pos:pos + lives.count(0)])
+            pos += len(eliminated)
+        if magic == cls._MAGIC:
+            picks = body[pos:pos + bi_pos], body[pos + bi_pos:pos + bi_pos + tri_pos]
+            pos += bi_pos + tri_pos
+        else:
+            picks = bytes(bi_pos), bytes(tri_pos)
+        if len(lives) != player_count or pos != len(body) or (
+                eliminated is not None and len(eliminated) != lives.count(0)):
+            raise ValueError("Not a game snapshot")
+        state = cls(player_count, base_round_time, start_lives, seed=seed)
+        state.picks = {"bi": bytearray(picks[0]), "tri": bytearray(picks[1])}
+        state.roster.lives = lives
+        state.roster.rebuild(eliminated)
+        state.phase = phase
+        state.round = round_no
+        state.turn = turn
+        state.use_trigrams = bool(use_trigrams)
+        state.bi_pos = bi_pos
+        state.tri_pos = tri_pos
+        state.ngram_index = ngram_index
+        state.round_time = round_time
+        return state
+
+class SnapshotWriter:
+    """
+    Writes snapshots atomically (temp file + rename) after every turn.
+
+    To spare the SD card only every sync_every-th write, and every write
+    at a round boundary, is fsync'd. A snapshot lost to a power cut before
+    its fsync just means resuming one or two turns earlier; a torn file
+    fails the CRC check and is ignored.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, sync_every=8):
+        self.path = path
+        self.sync_every = sync_every
+        self._unsynced = 0
+
+    def save(self, state):
+        tmp = self.path + ".tmp"
+        sync = (self._unsynced + 1 >= self.sync_every
+                or state.phase in (ROUND_END, GAME_OVER))
+        with open(tmp, "wb") as f:
+            f.write(state.to_bytes())
+            if sync:
+                f.flush()
+                os.fdatasync(f.fileno())
+        os.replace(tmp, self.path)
+        self._unsynced = 0 if sync else self._unsynced + 1
+
+    def clear(self):
+        for path in (self.path, self.path + ".tmp"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """Returns the saved GameState, or None if there is nothing to resume."""
+    try:
+        with open(path, "rb") as f:
+            state = GameState.from_bytes(f.read())
+    except (OSError, ValueError):
+        return None
+    if state.phase == GAME_OVER:
+        return None
+    return state
@@ -0,0 +1,212 @@
+# gpio_backend.py
+"""
+GPIO access through the Linux GPIO character device, with RPi.GPIO as the
+fallback.
+
+open_gpio() returns an object with the slice of the RPi.GPIO API the game
+uses (setup, output, input, add_event_detect, remove_event_detect, cleanup
+and the constants), so the driver and the buttons don't care which one
+they got. The gpiod backend (python3-gpiod 2.x, libgpiod v2) adds:
+
+  - watch(): every button line in one bulk request, debounced in the
+    kernel, with one reader thread blocked in select() on the request's fd;
+    callbacks get the kernel's CLOCK_MONOTONIC edge timestamp, which is
+    the same clock as clock.MonotonicClock
+  - all output lines (A0, RESN) in one request, so output() is one ioctl
+  - cleanup() only releases this process's own line requests, so a stray
+    call can't tear down pins some other code is still using
+
+RPi.GPIO is used when gpiod is missing or too old, when no Pi GPIO chip is
+found, or when NGRAM_GPIO=rpi. NGRAM_GPIOCHIP picks the chip explicitly.
+"""
+
+import glob
+import os
+import select
+import threading
+from datetime import timedelta
+
+CONSUMER = "ngram"
+# Labels of the chip that carries the 40-pin header on Pi 1-4 and Pi 5.
+PI_CHIP_LABELS = ("pinctrl-bcm2835", "pinctrl-bcm2711", "pinctrl-rp1")
+
+_gpiod = None
+
+def open_gpio():
+    """The gpiod backend if it can be used here, else RPi.GPIO (BCM numbering)."""
+    global _gpiod
+    if os.environ.get("NGRAM_GPIO", "") != "rpi":
+        if _gpiod is None:
+            _gpiod = _open_gpiod()
+        if _gpiod is not None:
+            return _gpiod
+
+    import RPi.GPIO as GPIO
+
+    GPIO.setwarnings(False)
+    if GPIO.getmode() is None:
+        GPIO.setmode(GPIO.BCM)
+    return GPIO
+
+def _open_gpiod():
+    try:
+        import gpiod
+    except ImportError:
+        return None
+    if not hasattr(gpiod, "request_lines"):
+        return None
+    chip = os.environ.get("NGRAM_GPIOCHIP") or find_chip(gpiod)
+    if chip is None:
+        return None
+    return GpiodGPIO(gpiod, chip)
+
+def find_chip(gpiod):
+    for path in sorted(glob.glob("/dev/gpiochip*")):
+        try:
+            with gpiod.Chip(path) as chip:
+                if chip.get_info().label in PI_CHIP_LABELS:
+                    return path
+        except OSError:
+            continue
+    return None
+
+class GpiodGPIO:
+    """RPi.GPIO look-alike over one GPIO chip, BCM numbers = line offsets."""
+
+    BCM = 11
+    IN = 1
+    OUT = 0
+    HIGH = 1
+    LOW = 0
+    PUD_UP = 22
+    PUD_DOWN = 21
+    PUD_OFF = 20
+    FALLING = 32
+    RISING = 31
+    BOTH = 33
+
+    def __init__(self, gpiod, chip):
+        from gpiod.line import Bias, Direction, Edge, Value
+
+        self.gpiod = gpiod
+        self.chip = chip
+        self._Bias, self._Direction, self._Edge, self._Value = Bias, Direction, Edge, Value
+        self._levels = {}
+        self._outputs = None
+        self._pulls = {}
+        self._watch = None
+        self._callbacks = {}
+        self._reader = None
+        self._wake = None
+
+    # The RPi.GPIO calls the scripts make at start-up.
+    def setwarnings(self, on):
+        pass
+
+    def setmode(self, mode):
+        pass
+
+    def getmode(self):
+        return self.BCM
+
+    ###########################################################################
+    # OUTPUTS: one request for all of them
+    ###########################################################################
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        if direction == self.IN:
+            self._pulls[pin] = pull_up_down
+            return
+        self._levels[pin] = self.HIGH if initial is None else initial
+        # Lines are only set up at start-up, so re-requesting the whole set
+        # here is cheap and leaves output() a single ioctl on one request.
+        if self._outputs is not None:
+            self._outputs.release()
+        settings = {
+            pin: self.gpiod.LineSettings(direction=self._Direction.OUTPUT,
+                                         output_value=self._value(level))
+            for pin, level in self._levels.items()
+        }
+        self._outputs = self.gpiod.request_lines(self.chip, consumer=CONSUMER, config=settings)
+
+    def _value(self, level):
+        return self._Value.ACTIVE if level else self._Value.INACTIVE
+
+    def output(self, pin, value):
+        self._outputs.set_value(pin, self._value(value))
+
+    def input(self, pin):
+        if self._watch is not None and pin in self._callbacks:
+            return int(self._watch.get_value(pin) == self._Value.ACTIVE)
+        return self._levels.get(pin, self.HIGH)
+
+    ###########################################################################
+    # INPUTS: one bulk edge request, one reader thread
+    ###########################################################################
+    def _bias(self, pull):
+        return {self.PUD_UP: self._Bias.PULL_UP,
+                self.PUD_DOWN: self._Bias.PULL_DOWN}.get(pull, self._Bias.AS_IS)
+
+    def watch(self, pins, callback, edge=FALLING, bouncetime=200):
+        """
+        Requests all pins for edge events in one go, debounced by the kernel.
+        callback(pin, timestamp) runs on the reader thread, timestamp being
+        the kernel's monotonic time of the edge in seconds.
+        """
+        self._stop_reader()
+        edges = {self.FALLING: self._Edge.FALLING, self.RISING: self._Edge.RISING,
+                 self.BOTH: self._Edge.BOTH}
+        for pin in pins:
+            self._callbacks[pin] = callback
+        settings = {
+            pin: self.gpiod.LineSettings(direction=self._Direction.INPUT,
+                                         edge_detection=edges[edge],
+                                         bias=self._bias(self._pulls.get(pin)),
+                                         debounce_period=timedelta(milliseconds=bouncetime))
+            for pin in self._callbacks
+        }
+        self._watch = self.gpiod.request_lines(self.chip, consumer=CONSUMER, config=settings)
+        self._start_reader()
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=200):
+        self.watch([pin], lambda pin, timestamp: callback(pin), edge, bouncetime)
+
+    def remove_event_detect(self, pin):
+        self._callbacks.pop(pin, None)
+        if not self._callbacks:
+            self._stop_reader()
+
+    def _start_reader(self):
+        self._wake = os.pipe()
+        self._reader = threading.Thread(target=self._read, args=(self._watch, self._wake[0]),
+                                        name="gpio-edges", daemon=True)
+        self._reader.start()
+
+    def _stop_reader(self):
+        if self._reader is not None:
+            os.write(self._wake[1], b"x")
+            self._reader.join()
+            os.close(self._wake[0])
+            os.close(self._wake[1])
+            self._reader = None
+        if self._watch is not None:
+            self._watch.release()
+            self._watch = None
+
+    def _read(self, request, wake):
+        while True:
+            ready, _, _ = select.select([request.fd, wake], [], [])
+            if wake in ready:
+                return
+            for event in request.read_edge_events():
+                callback = self._callbacks.get(event.line_offset)
+                if callback is not None:
+                    callback(event.line_offset, event.timestamp_ns / 1e9)
+
+    def cleanup(self, pins=None):
+        """Releases this process's line requests (pins is accepted and ignored)."""
+        self._callbacks.clear()
+        self._stop_reader()
+        if self._outputs is not None:
+            self._outputs.release()
+            self._outputs = None
+        self._levels.clear()
@@ -0,0 +1,74 @@
+# i2cbus.py
+"""
+Raw Linux i2c-dev access for the OLED, without smbus.
+
+SMBus block writes stop at 32 bytes, which would split every 128-byte page
+into five transactions. Here a message is any length up to max_chunk (the
+control byte included), and write_many() hands a whole frame's messages to
+the kernel in one I2C_RDWR ioctl, so a frame is a single syscall. Adapters
+that refuse I2C_RDWR get one write() per message instead.
+
+The bus rate can't be set from user space on the Pi; it comes from the
+device tree (dtparam=i2c_arm_baudrate=400000 or 1000000). bus_speed()
+reads back what the kernel is using.
+"""
+
+import ctypes
+import fcntl
+import os
+
+I2C_SLAVE = 0x0703
+I2C_RDWR = 0x0707
+# The kernel's limit on messages in one I2C_RDWR call.
+RDWR_MAX_MSGS = 42
+MAX_CHUNK = 4096
+
+class _Msg(ctypes.Structure):
+    _fields_ = [("addr", ctypes.c_uint16), ("flags", ctypes.c_uint16),
+                ("len", ctypes.c_uint16), ("buf", ctypes.c_char_p)]
+
+class _RdwrData(ctypes.Structure):
+    _fields_ = [("msgs", ctypes.POINTER(_Msg)), ("nmsgs", ctypes.c_uint32)]
+
+class I2CBus:
+
+    def __init__(self, bus=1, address=0x3C, max_chunk=MAX_CHUNK):
+        self.bus = bus
+        self.address = address
+        self.max_chunk = max_chunk
+        self.fd = os.open(f"/dev/i2c-{bus}", os.O_RDWR)
+        fcntl.ioctl(self.fd, I2C_SLAVE, address)
+        self._rdwr = True
+
+    def chunk(self, control, data):
+        """data as messages of at most max_chunk bytes, each led by control."""
+        step = self.max_chunk - 1
+        head = bytes([control])
+        return [head + data[i:i + step] for i in range(0, len(data), step)] or [head]
+
+    def write_many(self, messages):
+        """Sends each message as its own I2C write, in as few syscalls as possible."""
+        start = 0
+        while self._rdwr and start < len(messages):
+            batch = messages[start:start + RDWR_MAX_MSGS]
+            msgs = (_Msg * len(batch))(*(_Msg(self.address, 0, len(m), m) for m in batch))
+            try:
+                fcntl.ioctl(self.fd, I2C_RDWR, _RdwrData(msgs, len(batch)))
+            except OSError:
+                self._rdwr = False
+                break
+            start += len(batch)
+        for message in messages[start:]:
+            os.write(self.fd, message)
+
+    def close(self):
+        os.close(self.fd)
+
+def bus_speed(bus=1):
+    """The adapter's clock in Hz from the device tree, or None if unknown."""
+    path = f"/sys/class/i2c-adapter/i2c-{bus}/of_node/clock-frequency"
+    try:
+        with open(path, "rb") as f:
+            return int.from_bytes(f.read(4), "big")
+    except OSError:
+        return None
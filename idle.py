@@ -0,0 +1,154 @@
+# idle.py
+"""
+Power-aware idle handling for screens that wait on the buttons.
+
+    idle = IdleManager(panel, buttons)
+    key = idle.get(["A", "B", "C"])
+
+get() blocks on button edges like Buttons.get(), but after dim_after
+seconds without a press it turns the contrast down, and after off_after it
+switches the panel off (0xAE) and blocks with no timeout at all, so an idle
+launcher uses no CPU. The next press turns the panel back on with its old
+contrast straight from the edge callback's queue, well within a frame. A
+press that wakes a dark panel is swallowed on purpose: it is only a
+wake-up, not a menu choice, since the player couldn't see what they were
+choosing. A press on a dimmed panel still counts, as the menu is visible.
+
+The waits go through Buttons.get() and so through the clock, and the
+timings can be checked in virtual time without hardware:
+
+    python3 idle.py        # dim, off and wake-up on a VirtualClock
+"""
+
+import argparse
+
+import clock
+
+DIM_AFTER = 60.0
+OFF_AFTER = 300.0
+DIM_CONTRAST = 0x08
+
+AWAKE, DIMMED, OFF = range(3)
+
+class IdleManager:
+
+    def __init__(self, panel, buttons, dim_after=DIM_AFTER, off_after=OFF_AFTER,
+                 dim_contrast=DIM_CONTRAST):
+        self.panel = panel
+        self.buttons = buttons
+        self.dim_after = dim_after
+        self.off_after = off_after
+        self.dim_contrast = dim_contrast
+        self.state = AWAKE
+        self.last_activity = clock.now()
+        self._contrast = panel.contrast
+
+    def _timeout(self):
+        idle = clock.now() - self.last_activity
+        if self.state == AWAKE:
+            return max(0.0, self.dim_after - idle)
+        if self.state == DIMMED:
+            return max(0.0, self.off_after - idle)
+        return None
+
+    def _step_down(self):
+        if self.state == AWAKE:
+            self._contrast = self.panel.contrast
+            self.panel.set_contrast(min(self.dim_contrast, self._contrast))
+            self.state = DIMMED
+        elif self.state == DIMMED:
+            self.panel.display_off()
+            self.state = OFF
+
+    def wake(self):
+        """Brings the panel back to full brightness; True if it was off."""
+        was_off = self.state == OFF
+        if self.state != AWAKE:
+            self.panel.set_contrast(self._contrast)
+            if was_off:
+                self.panel.display_on()
+            self.state = AWAKE
+        self.last_activity = clock.now()
+        return was_off
+
+    def get(self, options=None):
+        """
+        Blocks until one of options is pressed, dimming as time passes.
+        Returns None if the panel is off and the wait ends without a press,
+        which only happens on a VirtualClock with nothing left to run.
+        """
+        while True:
+            label = self.buttons.get(timeout=self._timeout())
+            if label is None:
+                if self.state == OFF:
+                    return None
+                self._step_down()
+                continue
+            if self.wake():
+                continue
+            if options is None or label in options:
+                return label
+
+###############################################################################
+# CHECK
+###############################################################################
+class _LogPanel:
+    """Just the panel calls IdleManager makes, logged with the time."""
+
+    def __init__(self):
+        self.contrast = 0x80
+        self.log = []
+
+    def set_contrast(self, value):
+        self.contrast = value
+        self.log.append((clock.now(), f"contrast {value:#04x}"))
+
+    def display_off(self):
+        self.log.append((clock.now(), "off"))
+
+    def display_on(self):
+        self.log.append((clock.now(), "on"))
+
+def check():
+    """
+    Drives an IdleManager on a VirtualClock with fake buttons; returns the
+    panel log and the menu choices, each with its time.
+    """
+    import buttons
+    import fakehw
+
+    board = fakehw.Board()
+    old = clock.use(clock.VirtualClock())
+    try:
+        panel = _LogPanel()
+        idle = IdleManager(panel, buttons.Buttons(board.gpio()))
+        # A choice, then idle long enough to dim and go dark, then a press
+        # that only wakes the panel and one that is a choice again. The
+        # third get() goes dark once more and, with no presses left, ends.
+        for when, label in ((30, "A"), (400, "B"), (410, "C")):
+            clock.call_later(when, lambda label=label: board.press(label))
+        choices = []
+        for _ in range(3):
+            label = idle.get()
+            choices.append((clock.now(), label))
+    finally:
+        clock.use(old)
+    return panel.log, choices
+
+EXPECTED = ([(30 + DIM_AFTER, f"contrast {DIM_CONTRAST:#04x}"), (30 + OFF_AFTER, "off"),
+             (400, "contrast 0x80"), (400, "on"),
+             (410 + DIM_AFTER, f"contrast {DIM_CONTRAST:#04x}"), (410 + OFF_AFTER, "off")],
+            [(30, "A"), (410, "C"), (410 + OFF_AFTER, None)])
+
+def main():
+    argparse.ArgumentParser(description=__doc__.split("\n\n")[0]).parse_args()
+    log, choices = check()
+    chosen = [(t, "no presses left" if label is None else f"chose {label}") for t, label in choices]
+    for when, what in sorted(log + chosen, key=lambda entry: entry[0]):
+        print(f"{when:7.1f}s  {what}")
+    if (log, choices) != EXPECTED:
+        raise SystemExit(f"Expected {EXPECTED}")
+    print("ok")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# menu_launcher.py
+"""
+Button-driven launcher for returner6.py.
+
+Picks round speed, player count and lives, runs the game as a separate
+process (forked from a pre-loaded zygote, see zygote.py), and resumes an unfinished game from its snapshot: on start-up
+(after a power blip) and straight after a game process dies mid-game.
+"""
+
+import os
+import subprocess
+from PIL import Image, ImageDraw, ImageFont
+
+import clock
+import dither
+import gamestate
+import gpio_backend
+import metrics
+import sh1106
+import tracing
+import zygote
+from buttons import Buttons
+from idle import IdleManager
+
+GAME_SCRIPT = "returner6.py"
+MAX_RESUMES = 3
+SPLASH_IMAGE = "splash.png"
+SPLASH_SECONDS = 2
+
+# Game process exit codes: what the player picked on the end screen, or a
+# crash (anything else) that should be resumed from the snapshot.
+EXIT_MENU = 0
+EXIT_CRASH = 1
+EXIT_HALT = 3
+
+# Games started from here report back instead of taking over the launcher.
+GAME_ENV = dict(os.environ, NGRAM_LAUNCHER="1")
+
+MENU, PLAY, POST_GAME, HALT = range(4)
+
+GPIO = None
+panel = None
+buttons = None
+idle = None
+game_zygote = None
+
+# -----------------------------------------------------------------------------
+# OLED drawing helpers
+# -----------------------------------------------------------------------------
+def send_command(cmd_list):
+    panel.send_command(cmd_list)
+
+def display_img(image):
+    panel.write_frame(sh1106.pack_image(image, lit_white=True))
+
+def display_clear():
+    panel.write_frame(sh1106.BLANK_FRAME)
+
+def draw_centered(text_top, text_bottom=""):
+    img = Image.new("1", (128, 64), 0)
+    draw = ImageDraw.Draw(img)
+    try:
+        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 14)
+    except Exception:
+        font = ImageFont.load_default()
+
+    bbox1 = draw.textbbox((0, 0), text_top, font=font)
+    draw.text(((128 - (bbox1[2] - bbox1[0])) // 2, 10), text_top, font=font, fill=1)
+
+    if text_bottom:
+        bbox2 = draw.textbbox((0, 0), text_bottom, font=font)
+        draw.text(((128 - (bbox2[2] - bbox2[0])) // 2, 35), text_bottom, font=font, fill=1)
+
+    display_img(img)
+
+# -----------------------------------------------------------------------------
+# Buttons
+# -----------------------------------------------------------------------------
+def wait_for_button(options):
+    # Dims and then switches the panel off while nobody is pressing anything.
+    return idle.get(options)
+
+# -----------------------------------------------------------------------------
+# Menus
+# -----------------------------------------------------------------------------
+def menu_loop():
+    speeds = ["Slow", "Medium", "Fast"]
+    speed_values = {"Slow": 15, "Medium": 10, "Fast": 5}
+    speed_index = 1
+    players = 2
+    lives = 3
+
+    # Menu 1: Speed
+    while True:
+        draw_centered("Round Speed", speeds[speed_index])
+        key = wait_for_button(["A", "B", "C"])
+        if key == "A": speed_index = (speed_index - 1) % len(speeds)
+        elif key == "C": speed_index = (speed_index + 1) % len(speeds)
+        elif key == "B": break
+
+    # Menu 2: Player Count
+    while True:
+        draw_centered("Players", str(players))
+        key = wait_for_button(["A", "B", "C"])
+        if key == "A" and players > 1: players -= 1
+        elif key == "C" and players < 10: players += 1
+        elif key == "B": break
+
+    # Menu 3: Lives
+    while True:
+        draw_centered("Lives", str(lives))
+        key = wait_for_button(["A", "B", "C"])
+        if key == "A" and lives > 1: lives -= 1
+        elif key == "C" and lives < 9: lives += 1
+        elif key == "B": break
+
+    # Menu 4: Tracing (written to trace.json by the game when it exits)
+    while True:
+        draw_centered("Tracing", "On" if tracing_enabled() else "Off")
+        key = wait_for_button(["A", "B", "C"])
+        if key in ("A", "C"): set_tracing(not tracing_enabled())
+        elif key == "B": break
+
+    return players, speed_values[speeds[speed_index]], lives
+
+def post_game_menu():
+    draw_centered("Game Over", "A: Again  B: Menu  C: Off")
+    return wait_for_button(["A", "B", "C"])
+
+# -----------------------------------------------------------------------------
+# Tracing switch, handed to game processes through the environment
+# -----------------------------------------------------------------------------
+def tracing_enabled():
+    return os.environ.get("NGRAM_TRACE", "") not in ("", "0")
+
+def set_tracing(on):
+    os.environ["NGRAM_TRACE"] = GAME_ENV["NGRAM_TRACE"] = "1" if on else "0"
+    tracing.enable(on)
+
+# -----------------------------------------------------------------------------
+# Running and resuming games
+# -----------------------------------------------------------------------------
+def open_hardware():
+    """(Re)opens the GPIO lines, the panel, the buttons and idle handling."""
+    global GPIO, panel, buttons, idle
+    GPIO = gpio_backend.open_gpio()
+    panel = sh1106.open_panels(gpio=GPIO)
+    buttons = Buttons(GPIO)
+    idle = IdleManager(panel, buttons)
+
+def release_hardware():
+    buttons.close()
+    panel.close()
+    GPIO.cleanup()
+
+def play(args):
+    """
+    launch(args) with the launcher's GPIO lines and SPI device given up for
+    the game. The gpiod backend requests lines exclusively, so the game
+    couldn't get A0, RESN or the buttons while we held them. Reopening
+    afterwards also leaves no presses or A0 level over from the game.
+    """
+    release_hardware()
+    try:
+        return launch(args)
+    finally:
+        open_hardware()
+
+def launch(args):
+    """Runs the game script with args and returns its exit code."""
+    if game_zygote is not None:
+        code = game_zygote.run(GAME_SCRIPT, args, GAME_ENV)
+        if code is not None:
+            return code
+    return subprocess.run(["python3", GAME_SCRIPT, *map(str, args)], env=GAME_ENV).returncode
+
+def halt():
+    os.system("sudo halt")
+
+def run_game(args):
+    """
+    Runs one game process and returns its exit code, resuming it from its
+    snapshot if it dies mid-game.
+    """
+    code = play(args)
+    for _ in range(MAX_RESUMES):
+        if code not in (EXIT_MENU, EXIT_HALT):
+            resumed = resume_pending()
+            if resumed is not None:
+                code = resumed
+                continue
+        break
+    return code
+
+def resume_pending():
+    """Resumes a saved, unfinished game; None if there is nothing to resume."""
+    state = gamestate.load_snapshot()
+    if state is None:
+        return None
+    draw_centered("Resuming", f"Round {state.round}")
+    return play(["--resume"])
+
+def main():
+    """
+    Launcher state machine. Each game reports back through its exit code
+    and the loop moves to the next screen without nesting calls, so nothing
+    piles up however many games are played.
+    """
+    global game_zygote
+    # Forked first, while this process holds no hardware and no threads.
+    if zygote.enabled():
+        game_zygote = zygote.Zygote.start()
+    metrics.serve()
+    open_hardware()
+
+    if os.path.exists(SPLASH_IMAGE):
+        panel.write_frame(dither.load(SPLASH_IMAGE, lit_white=True))
+        clock.sleep(SPLASH_SECONDS)
+
+    try:
+        settings = None
+        screen = MENU
+        code = resume_pending()
+        if code is not None:
+            screen = {EXIT_MENU: MENU, EXIT_HALT: HALT}.get(code, POST_GAME)
+        while screen != HALT:
+            if screen == MENU:
+                settings = menu_loop()
+                screen = PLAY
+            elif screen == PLAY:
+                code = run_game(settings)
+                screen = {EXIT_MENU: MENU, EXIT_HALT: HALT}.get(code, POST_GAME)
+            elif screen == POST_GAME:
+                action = post_game_menu()
+                if action == "A" and settings is not None:
+                    screen = PLAY
+                elif action == "C":
+                    screen = HALT
+                else:
+                    screen = MENU
+
+        display_clear()
+        send_command([0xAE])
+        buttons.close()
+        panel.close()
+        GPIO.cleanup()
+        if game_zygote is not None:
+            game_zygote.close()
+        halt()
+    except Exception as e:
+        print("Launcher crashed:", e)
+        GPIO.cleanup()
+
+if __name__ == '__main__':
+    main()
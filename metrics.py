@@ -0,0 +1,260 @@
+# metrics.py
+"""
+Counters and latency histograms with a Prometheus text endpoint.
+
+Recording is per thread: every thread gets its own counter dict and bucket
+lists the first time it records anything, so inc() and observe() never take
+a lock. A scrape adds all the per-thread values up. Once a thread has
+finished, its values are folded into one store for finished threads, so
+short-lived threads (one per turn for the ticking sound) don't pile up.
+
+The launcher calls serve(), which answers HTTP on a Unix socket:
+
+    curl --unix-socket /tmp/ngram-metrics.sock http://localhost/metrics
+
+Game processes call start_pusher(); it POSTs their totals to the launcher
+every few seconds and once more on exit, and the launcher folds them in, so
+one scrape covers the launcher and every game it has run.
+"""
+
+import bisect
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+
+SOCKET_PATH = "/tmp/ngram-metrics.sock"
+PREFIX = "ngram_"
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+HISTOGRAMS = {
+    "frame_seconds": _LATENCY_BUCKETS,
+    "spi_transfer_seconds": _LATENCY_BUCKETS,
+    "input_latency_seconds": _LATENCY_BUCKETS,
+    "sound_start_seconds": _LATENCY_BUCKETS,
+    "reaction_seconds": (0.25, 0.5, 1, 2, 3, 5, 8, 13),
+}
+
+COUNTERS = (
+    "games_started_total",
+    "games_finished_total",
+    "frames_presented_total",
+    "frames_coalesced_total",
+    "frames_dropped_total",
+    "button_presses_total",
+    "timeouts_total",
+)
+
+###############################################################################
+# PER-THREAD COLLECTION
+###############################################################################
+_local = threading.local()
+# Thread -> its store, for threads that have recorded something.
+_stores = {}
+_stores_lock = threading.Lock()
+
+def _empty():
+    return {
+        "counters": dict.fromkeys(COUNTERS, 0),
+        "buckets": {name: [0] * (len(b) + 1) for name, b in HISTOGRAMS.items()},
+        "sums": dict.fromkeys(HISTOGRAMS, 0.0),
+    }
+
+_finished_threads = _empty()
+
+def _store():
+    store = getattr(_local, "store", None)
+    if store is None:
+        store = _local.store = _empty()
+        with _stores_lock:
+            _retire_finished()
+            _stores[threading.current_thread()] = store
+    return store
+
+def _retire_finished():
+    """Folds finished threads' stores into _finished_threads. Holds _stores_lock."""
+    for thread in [t for t in _stores if not t.is_alive()]:
+        # A finished thread can't record any more, so no copy is needed.
+        _add(_finished_threads, _stores.pop(thread))
+
+def inc(name, amount=1):
+    _store()["counters"][name] += amount
+
+def observe(name, value):
+    store = _store()
+    store["buckets"][name][bisect.bisect_left(HISTOGRAMS[name], value)] += 1
+    store["sums"][name] += value
+
+###############################################################################
+# SNAPSHOTS
+###############################################################################
+def _add(total, part):
+    for name, value in part["counters"].items():
+        total["counters"][name] = total["counters"].get(name, 0) + value
+    for name, counts in part["buckets"].items():
+        if name in total["buckets"]:
+            total["buckets"][name] = [a + b for a, b in zip(total["buckets"][name], counts)]
+            total["sums"][name] += part["sums"][name]
+
+def snapshot():
+    """This process's totals across all threads."""
+    total = _empty()
+    with _stores_lock:
+        _retire_finished()
+        # Finished threads' totals only change under the lock, so add them
+        # here; live stores are copied first so a thread recording
+        # mid-scrape can't change a list under us.
+        _add(total, _finished_threads)
+        stores = [{
+            "counters": dict(store["counters"]),
+            "buckets": {k: list(v) for k, v in store["buckets"].items()},
+            "sums": dict(store["sums"]),
+        } for store in _stores.values()]
+    for store in stores:
+        _add(total, store)
+    return total
+
+###############################################################################
+# EXPOSITION
+###############################################################################
+def _gauges():
+    load1, _, _ = os.getloadavg()
+    return {
+        "load1": load1,
+        "process_cpu_seconds": time.process_time(),
+    }
+
+def render(total):
+    lines = []
+    for name, value in total["counters"].items():
+        lines.append(f"# TYPE {PREFIX}{name} counter")
+        lines.append(f"{PREFIX}{name} {value}")
+    for name, counts in total["buckets"].items():
+        lines.append(f"# TYPE {PREFIX}{name} histogram")
+        running = 0
+        for bound, count in zip(HISTOGRAMS[name], counts):
+            running += count
+            lines.append(f'{PREFIX}{name}_bucket{{le="{bound}"}} {running}')
+        running += counts[-1]
+        lines.append(f'{PREFIX}{name}_bucket{{le="+Inf"}} {running}')
+        lines.append(f"{PREFIX}{name}_sum {total['sums'][name]}")
+        lines.append(f"{PREFIX}{name}_count {running}")
+    for name, value in _gauges().items():
+        lines.append(f"# TYPE {PREFIX}{name} gauge")
+        lines.append(f"{PREFIX}{name} {value}")
+    return "\n".join(lines) + "\n"
+
+###############################################################################
+# LAUNCHER SIDE: SERVER
+###############################################################################
+# Latest totals pushed by each running game, and the sum of finished ones.
+_children = {}
+_finished_games = _empty()
+_children_lock = threading.Lock()
+
+def _collect():
+    total = snapshot()
+    with _children_lock:
+        _add(total, _finished_games)
+        for child in _children.values():
+            _add(total, child)
+    return total
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render(_collect()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != "/push":
+            self.send_error(404)
+            return
+        push = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with _children_lock:
+            if push["final"]:
+                _children.pop(push["pid"], None)
+                _add(_finished_games, push["totals"])
+            else:
+                _children[push["pid"]] = push["totals"]
+        self.send_response(204)
+        self.end_headers()
+
+    def address_string(self):
+        return "local"
+
+    def log_message(self, format, *args):
+        pass
+
+class _UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+class _TCPHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+def serve(path=None, port=None):
+    """
+    Starts the metrics server on a background thread: on the Unix socket at
+    path, or on localhost:port if a port is given.
+    """
+    if port is not None:
+        server = _TCPHTTPServer(("127.0.0.1", port), _Handler)
+    else:
+        path = path or SOCKET_PATH
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        server = _UnixHTTPServer(path, _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+###############################################################################
+# GAME SIDE: PUSHER
+###############################################################################
+def push(path=None, final=False):
+    body = json.dumps({"pid": os.getpid(), "final": final,
+                       "totals": snapshot()}).encode()
+    request = (f"POST /push HTTP/1.0\r\nContent-Length: {len(body)}\r\n"
+               "Content-Type: application/json\r\n\r\n").encode() + body
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(1.0)
+        sock.connect(path or SOCKET_PATH)
+        sock.sendall(request)
+        sock.recv(256)
+
+def start_pusher(path=None, interval=5.0):
+    """Pushes this process's totals to the launcher until stop() is called."""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                push(path)
+            except OSError:
+                pass
+
+    threading.Thread(target=run, name="metrics-push", daemon=True).start()
+
+    def finish():
+        stop.set()
+        try:
+            push(path, final=True)
+        except OSError:
+            pass
+    return finish
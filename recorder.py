@@ -0,0 +1,252 @@
+# recorder.py
+"""
+Capture and replay of everything the panel showed.
+
+RecordingPanel goes in a PanelGroup next to the panel (recording() puts it
+there), so it is sent what the panel is sent. Every frame is stored as the
+XOR against the previous one, run-length encoded: a frame that changed one
+letter costs its changed bytes plus a few, an unchanged one costs the
+7-byte record header. Register changes (inverse, on/off, contrast,
+scrolling) are stored too, so effects replay as they looked.
+
+    header   "NGRC", version, 0, start time (float64 wall clock)
+    record   kind (uint8), ms since start (uint32), payload length (uint16)
+    FRAME    XOR delta: (zero run, literal run) varint pairs + literals
+    KEY      same, against a blank frame; written first and every
+             KEY_INTERVAL frames, so a file can be read from any key frame
+    STATE    start line, display offset, contrast, inverse, on (5 bytes)
+
+Encoding is a big-int XOR and a regex scan, done on the render thread in
+tens of microseconds; records go into a buffered file flushed once a second
+and rotated at max_bytes, so recording can stay on during real games.
+returner6.py records when NGRAM_RECORD names a file.
+
+    python3 recorder.py display.rec                  # summary
+    python3 recorder.py display.rec --gif out.gif    # or --apng out.png
+"""
+
+import argparse
+import os
+import re
+import struct
+import time
+
+import clock
+import sh1106
+
+RECORD_PATH = "display.rec"
+MAGIC = b"NGRC"
+VERSION = 1
+HEADER = struct.Struct("<4sHHd")
+RECORD = struct.Struct("<BIH")
+STATE = struct.Struct("<BBBBB")
+
+FRAME, KEY, STATE_CHANGE = range(1, 4)
+KEY_INTERVAL = 300
+
+# Zero gaps shorter than this are kept inside a literal run; a new run
+# would cost more in varints than the zeros do.
+_NONZERO = re.compile(rb"[^\x00]+(?:\x00{1,2}[^\x00]+)*")
+
+###############################################################################
+# DELTA CODING
+###############################################################################
+def _varint(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return out
+
+def _read_varint(data, pos):
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+def xor_frames(a, b):
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+def encode_delta(previous, frame):
+    delta = xor_frames(previous, frame)
+    out = bytearray()
+    pos = 0
+    for run in _NONZERO.finditer(delta):
+        out += _varint(run.start() - pos)
+        out += _varint(run.end() - run.start())
+        out += run.group()
+        pos = run.end()
+    return bytes(out)
+
+def apply_delta(previous, payload):
+    delta = bytearray(len(previous))
+    pos = at = 0
+    while at < len(payload):
+        skip, at = _read_varint(payload, at)
+        length, at = _read_varint(payload, at)
+        pos += skip
+        delta[pos:pos + length] = payload[at:at + length]
+        pos += length
+        at += length
+    return xor_frames(previous, delta)
+
+###############################################################################
+# RECORDING
+###############################################################################
+class Recorder:
+
+    def __init__(self, path=RECORD_PATH, max_bytes=8 << 20, flush_interval=1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.frames = 0
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "wb", buffering=1 << 16)
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, time.time()))
+        self._size = HEADER.size
+        self._start = clock.now()
+        self._last_flush = self._start
+        self._previous = None
+        self._since_key = 0
+
+    def _write(self, kind, payload):
+        now = clock.now()
+        ms = int((now - self._start) * 1000) & 0xFFFFFFFF
+        self._file.write(RECORD.pack(kind, ms, len(payload)))
+        self._file.write(payload)
+        self._size += RECORD.size + len(payload)
+        if now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def frame(self, frame):
+        if self._size >= self.max_bytes:
+            self._rotate()
+        if self._previous is None or self._since_key >= KEY_INTERVAL:
+            self._write(KEY, encode_delta(sh1106.BLANK_FRAME, frame))
+            self._since_key = 0
+        else:
+            self._write(FRAME, encode_delta(self._previous, frame))
+        self._previous = frame
+        self._since_key += 1
+        self.frames += 1
+
+    def state(self, line, offset, contrast, inverse, on):
+        self._write(STATE_CHANGE, STATE.pack(line, offset, contrast, inverse, on))
+
+    def _rotate(self):
+        self._file.close()
+        os.replace(self.path, self.path + ".1")
+        self._open()
+
+    def close(self):
+        self._file.close()
+
+class RecordingPanel(sh1106.MirrorPanel):
+    """Records every frame and register change it is sent."""
+
+    def __init__(self, recorder):
+        super().__init__()
+        self.recorder = recorder
+
+    def _frame_changed(self, old):
+        self.recorder.frame(self.frame)
+
+    def _state_changed(self):
+        self.recorder.state(self.start_line, self.display_offset, self.contrast,
+                            self.inverse, self.on)
+
+    def close(self):
+        self.recorder.close()
+
+def recording(panel, path=RECORD_PATH):
+    """panel (or its PanelGroup) with a RecordingPanel writing to path added."""
+    sink = RecordingPanel(Recorder(path))
+    if isinstance(panel, sh1106.PanelGroup):
+        panel.panels.append(sink)
+        return panel
+    return sh1106.PanelGroup([panel, sink])
+
+###############################################################################
+# REPLAY
+###############################################################################
+def replay(path=RECORD_PATH):
+    """
+    Yields (seconds since start, frame, state) for every record, state being
+    (start line, offset, contrast, inverse, on). Records before the first
+    key frame are skipped.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, _, _ = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} display recording")
+    pos = HEADER.size
+    frame = None
+    state = (0, 0, 0x80, False, True)
+    while pos + RECORD.size <= len(data):
+        kind, ms, length = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        payload = data[pos:pos + length]
+        pos += length
+        if len(payload) < length:
+            break
+        if kind == KEY:
+            frame = apply_delta(sh1106.BLANK_FRAME, payload)
+        elif kind == FRAME and frame is not None:
+            frame = apply_delta(frame, payload)
+        if kind in (KEY, FRAME):
+            # Writing a frame turns the display on.
+            state = state[:4] + (True,)
+        elif kind == STATE_CHANGE:
+            line, offset, contrast, inverse, on = STATE.unpack(payload)
+            state = (line, offset, contrast, bool(inverse), bool(on))
+        if frame is not None:
+            yield ms / 1000, frame, state
+
+def export(path, out, scale=3):
+    """Writes the recording as an animated GIF, or APNG if out ends in .png."""
+    images, durations = [], []
+    last = None
+    for t, frame, state in replay(path):
+        picture = sh1106.shown_frame(frame, *state)
+        if last is not None and picture == last[1]:
+            continue
+        if last is not None:
+            durations.append(max(20, int((t - last[0]) * 1000)))
+        images.append(sh1106.unpack_frame(picture).convert("L")
+                      .resize((sh1106.WIDTH * scale, sh1106.HEIGHT * scale)))
+        last = (t, picture)
+    if not images:
+        raise ValueError(f"{path} has no frames")
+    durations.append(1000)
+    images[0].save(out, save_all=True, append_images=images[1:], duration=durations,
+                   loop=0, format="PNG" if out.lower().endswith(".png") else "GIF")
+    return len(images)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("recording", nargs="?", default=RECORD_PATH)
+    parser.add_argument("--gif", help="export an animated GIF")
+    parser.add_argument("--apng", help="export an animated PNG")
+    parser.add_argument("--scale", type=int, default=3)
+    args = parser.parse_args()
+
+    records = list(replay(args.recording))
+    size = os.path.getsize(args.recording)
+    length = records[-1][0] if records else 0
+    print(f"{len(records)} records over {length:.1f}s, {size} bytes "
+          f"({size / max(1, len(records)):.1f} bytes/record)")
+    for out in (args.gif, args.apng):
+        if out:
+            print(f"Wrote {export(args.recording, out, args.scale)} frames to {out}")
+
+if __name__ == "__main__":
+    main()
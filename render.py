@@ -0,0 +1,196 @@
+# render.py
+"""
+Double-buffered render thread for the SH1106 panel.
+
+The game thread packs a frame and hands it over with submit(), which only
+swaps the back buffer and returns. The render thread wakes up, paces itself
+to the target frame rate and pushes the newest back buffer to the panel.
+Frames submitted faster than the panel can take them are coalesced: only
+the latest one is ever drawn.
+
+The thread also steps effects (see transitions.py): generators that take the
+panel, issue a few command bytes and yield once per frame.
+
+If the panel raises (an SPI OSError, say), the render thread stops and the
+error is raised again on the game thread by the next submit(), play(),
+flush() or send_command(), so the game crashes out instead of waiting on a
+thread that is gone.
+"""
+
+import threading
+
+import clock
+import metrics
+import tracing
+
+class RenderThread(threading.Thread):
+
+    def __init__(self, panel, fps=30):
+        super().__init__(name="render", daemon=True)
+        self.panel = panel
+        self.frame_interval = 1.0 / fps
+        self._cond = threading.Condition()
+        self._back = None
+        self._back_time = 0.0
+        self._effect = None
+        # Replaced effects, closed by the render thread between steps.
+        self._retired = []
+        self._busy = False
+        self._running = True
+        # What stopped the render thread, if something did.
+        self.error = None
+        # Front buffer: the frame currently on the panel.
+        self.front = None
+        self.frames_presented = 0
+        self.frames_coalesced = 0
+        self.frames_dropped = 0
+
+    ###########################################################################
+    # GAME THREAD SIDE
+    ###########################################################################
+    def _check(self):
+        if self.error is not None:
+            raise RuntimeError(f"Render thread failed: {self.error}") from self.error
+
+    def _idle(self):
+        return self.error is not None or (self._back is None and self._effect is None
+                                          and not self._retired and not self._busy)
+
+    def submit(self, frame):
+        """Swaps in a new back buffer and returns immediately."""
+        with self._cond:
+            self._check()
+            if self._back is not None:
+                self.frames_coalesced += 1
+                metrics.inc("frames_coalesced_total")
+            self._back = frame
+            self._back_time = clock.now()
+            self._cond.notify_all()
+
+    def play(self, effect, frame=None):
+        """
+        Starts effect(panel) on the render thread, replacing a running one.
+        If frame is given it is swapped in together with the effect's first
+        step, so the step can set up the panel before the frame lands.
+
+        Only the render thread touches effects: the replaced one is closed
+        there, before the new one's first step, so its clean-up commands
+        never run on this thread or in the middle of a step.
+        """
+        with self._cond:
+            self._check()
+            if self._effect is not None:
+                self._retired.append(self._effect)
+            self._effect = effect(self.panel)
+            if frame is not None:
+                if self._back is not None:
+                    self.frames_coalesced += 1
+                self._back = frame
+                self._back_time = clock.now()
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Blocks until every submitted frame has reached the panel."""
+        with self._cond:
+            done = self._cond.wait_for(self._idle, timeout)
+            self._check()
+            return done
+
+    def send_command(self, cmd_list):
+        """Sends raw panel commands once frames and effects are done with the panel."""
+        with self._cond:
+            self._cond.wait_for(self._idle)
+            self._check()
+            self.panel.send_command(cmd_list)
+
+    def stop(self, timeout=1.0):
+        """Lets pending frames out and ends the thread; never raises its error."""
+        with self._cond:
+            self._cond.wait_for(self._idle, timeout)
+            self._running = False
+            self._running = False
+            self._cond.notify_all()
+        self.join(timeout)
+
+    def stats(self):
+        return {
+            "presented": self.frames_presented,
+            "coalesced": self.frames_coalesced,
+            "dropped": self.frames_dropped,
+        }
+
+    ###########################################################################
+    # RENDER THREAD SIDE
+    ###########################################################################
+    def run(self):
+        next_tick = clock.now()
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._back is not None or self._effect is not None
+                    or self._retired or not self._running)
+                if not self._running:
+                    return
+
+            now = clock.now()
+            if now < next_tick:
+                clock.sleep(next_tick - now)
+
+            with self._cond:
+                frame, submitted = self._back, self._back_time
+                effect = self._effect
+                retired, self._retired = self._retired, []
+                self._back = None
+                self._busy = True
+
+            t0 = tracing.start()
+            error = None
+            try:
+                for old in retired:
+                    self._close(old)
+                if effect is not None:
+                    self._step(effect)
+                if frame is not None:
+                    if frame != self.front:
+                        self.panel.write_frame(frame)
+                        self.front = frame
+                    self.frames_presented += 1
+                    metrics.inc("frames_presented_total")
+            except Exception as e:
+                # The panel is gone; the game thread gets the error.
+                error = e
+            finally:
+                tracing.end(tracing.RENDER, t0)
+                done = clock.now()
+                # A frame that took more than one extra interval to reach the
+                # panel missed its slot.
+                if frame is not None:
+                    metrics.observe("frame_seconds", done - submitted)
+                    if done - submitted > 2 * self.frame_interval:
+                        self.frames_dropped += 1
+                        metrics.inc("frames_dropped_total")
+                next_tick = max(next_tick + self.frame_interval, done)
+                with self._cond:
+                    self._busy = False
+                    self.error = error
+                    self._cond.notify_all()
+            if error is not None:
+                return
+
+    def _close(self, effect):
+        try:
+            effect.close()
+        except Exception as e:
+            print("Display effect failed:", e)
+
+    def _step(self, effect):
+        try:
+            next(effect)
+            return
+        except StopIteration:
+            pass
+        except Exception as e:
+            print("Display effect failed:", e)
+        with self._cond:
+            if self._effect is effect:
+                self._effect = None
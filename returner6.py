@@ -10,20 +10,40 @@ import os
 import sys
 import time
 import json
-import random
-import spidev
-import RPi.GPIO as GPIO
 from PIL import Image
 import threading
 import pygame
 
-# BUTTON INPUT SETUP
-BUTTON_PIN = 17  # BCM pin 17 (physical pin 11)
-button_pressed = False
+import analytics
+import clock
+import engine
+import eventlog
+import gamestate
+import gpio_backend
+import metrics
+import recorder
+import sh1106
+import tracing
+import transitions
+from assetpack import AssetPack
+from buttons import Buttons
+from idle import IdleManager
+from menu_launcher import EXIT_CRASH, EXIT_HALT, EXIT_MENU
+from render import RenderThread
 
-def button_callback(channel):
-    global button_pressed
-    button_pressed = True
+# BUTTON INPUT SETUP
+GAME_BUTTON = "A"  # BCM pin 17 (physical pin 11)
+# Set by the edge callback; turn timers and the ticking sound wait on it.
+button_event = threading.Event()
+press_time = 0.0
+
+def button_callback(label, when):
+    global press_time
+    if label != GAME_BUTTON:
+        return
+    press_time = when
+    button_event.set()
+    tracing.instant(tracing.INPUT)
     if not pygame.mixer.get_init():
         pygame.mixer.init()
     try:
@@ -31,9 +51,8 @@ def button_callback(channel):
     except Exception as e:
         print("Failed to play sound:", e)
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.add_event_detect(BUTTON_PIN, GPIO.FALLING, callback=button_callback, bouncetime=200)
+GPIO = gpio_backend.open_gpio()
+buttons = Buttons(GPIO, callback=button_callback)
 
 ###############################################################################
 # SH1106 / SPI DISPLAY SETUP
@@ -41,40 +60,21 @@ GPIO.add_event_detect(BUTTON_PIN, GPIO.FALLING, callback=button_callback, bounce
 A0   = 25  # BCM pin 25
 RESN = 24  # BCM pin 24
 
-GPIO.setup(A0, GPIO.OUT, initial=GPIO.HIGH)
-GPIO.setup(RESN, GPIO.OUT, initial=GPIO.HIGH)
+panel = sh1106.open_panels(a0=A0, resn=RESN, gpio=GPIO)
+# NGRAM_RECORD=display.rec keeps a replayable log of the screen (recorder.py).
+if os.environ.get("NGRAM_RECORD"):
+    panel = recorder.recording(panel, os.environ["NGRAM_RECORD"])
 
-spi = spidev.SpiDev()
-spi.open(0, 0)
-spi.max_speed_hz = 1000000
-spi.mode = 0b00
+# Frames are pushed by a dedicated render thread so a slow SPI transfer never
+# delays the round timer on the game thread.
+renderer = RenderThread(panel)
+renderer.start()
 
 def send_command(cmd_list):
-    GPIO.output(A0, 0)
-    spi.xfer(cmd_list)
+    renderer.send_command(cmd_list)
 
 def display_img(image):
-    data_slice = [[] for _ in range(8)]
-    image = image.convert('1')
-    image = image.resize((128, 64))
-    image = image.rotate(180)
-
-    for p in range(8):
-        data_set = []
-        for c in range(128):
-            b_byte = 0x00
-            for b in range(8):
-                pixel = image.getpixel((c, p * 8 + b))
-                bit_val = 0 if pixel == 255 else 1
-                b_byte |= (bit_val << b)
-            data_set.append(b_byte)
-        data_slice[p] = data_set
-
-    send_command([0xAF])
-    for p in range(8):
-        send_command([0xB0 + p, 0x02, 0x10])
-        GPIO.output(A0, 1)
-        spi.xfer(data_slice[p])
+    renderer.submit(sh1106.pack_image(image, rotate=True))
 
 def display_clear():
     blank_img = Image.new('1', (128, 64), 1)
@@ -92,26 +92,17 @@ def show_end_options():
     draw.text((10, 30), "B: Shutdown", font=font, fill=0)
     display_img(img)
 
-    while True:
-        if GPIO.input(17) == GPIO.LOW:
-            time.sleep(0.5)
-            import menu_launcher
-            GPIO.cleanup()
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setup(17, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-            GPIO.setup(27, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-            GPIO.setup(22, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-            menu_launcher.main()
-        elif GPIO.input(27) == GPIO.LOW:
-            time.sleep(0.5)
-            os.system("sudo halt")
-        time.sleep(0.1)
-
-GPIO.output(RESN, 0)
-time.sleep(0.1)
-GPIO.output(RESN, 1)
-time.sleep(0.1)
-send_command([0xA7])
+    # Returns the exit code that tells the launcher where to go next. The
+    # render thread is idle from here on, so the idle manager can dim the
+    # panel directly.
+    buttons.clear()
+    renderer.flush()
+    if IdleManager(panel, buttons).get(["A", "B"]) == "A":
+        return EXIT_MENU
+    return EXIT_HALT
+
+panel.reset()
+panel.set_inverse(True)
 
 ###############################################################################
 # GAME LOGIC
@@ -127,7 +118,19 @@ with open(triFilePath, 'r') as file:
 
 letter_image_paths = {chr(i): f"letters/{chr(i)}.jpg" for i in range(65, 91)}
 
+# Prebuilt 1-bit letters (see assetpack.py); the JPEGs are the fallback.
+LETTER_STYLE = os.environ.get("NGRAM_LETTER_STYLE") or None
+try:
+    letter_pack = AssetPack()
+except FileNotFoundError:
+    letter_pack = None
+
 def create_letter_image(ngram):
+    t0 = tracing.start()
+    if letter_pack is not None:
+        combined = letter_pack.compose(ngram, LETTER_STYLE, width=sh1106.WIDTH)
+        tracing.end(tracing.LETTERS, t0)
+        return combined
     letter_imgs = []
     for ch in ngram:
         upper_char = ch.upper()
@@ -145,146 +148,210 @@ def create_letter_image(ngram):
     for img in letter_imgs:
         combined.paste(img, (x_offset, 0))
         x_offset += img.width
+    tracing.end(tracing.LETTERS, t0)
     return combined
 
-def lifeLogic(lst):
-    return [i for i in lst if i != 0]
-
 def play_ticking(duration):
+    started = clock.now()
+    t0 = tracing.start()
     pygame.mixer.init()
     tick = pygame.mixer.Sound("tick.wav")
     fast_tick = pygame.mixer.Sound("tick_fast.wav")
+    tracing.end(tracing.SOUND, t0)
+    metrics.observe("sound_start_seconds", clock.now() - started)
     tick_channel = pygame.mixer.find_channel()
     fast_channel = pygame.mixer.find_channel()
-    start = time.time()
+    end = started + duration
+    next_tick = clock.now()
 
-    while time.time() - start < duration:
-        if button_pressed:
-            if tick_channel:
-                tick_channel.stop()
-            break
-        remaining = duration - (time.time() - start)
-        if remaining > 2:
+    # Ticks are scheduled on absolute deadlines so they don't drift, and
+    # waiting on the button event stops the sound the moment it's pressed.
+    while next_tick < end and not button_event.is_set():
+        if end - next_tick > 2:
             if tick_channel:
                 tick_channel.stop()
             tick_channel = tick.play()
-            time.sleep(1)
+            next_tick += 1
         else:
             if fast_channel:
                 fast_channel.stop()
             fast_channel = fast_tick.play()
-            time.sleep(0.3)
-        if button_pressed and tick_channel:
-            tick_channel.stop()
-            break
-
-def roundStart(players, roundTime, bigrams_dict, trigrams_dict, useTrigrams):
-    if useTrigrams:
-        random_ngram = random.choice(trigrams_dict["top_300_trigrams"])
-        print(f"Using TRIGRAM: '{random_ngram}'")
-    else:
-        random_ngram = random.choice(bigrams_dict["top_300_bigrams"])
-        print(f"Using BIGRAM: '{random_ngram}'")
-
-    combined_img = create_letter_image(random_ngram)
-    if combined_img:
-        display_img(combined_img)
-    else:
-        display_clear()
-
-    turnsLeft = len(players)
-    print("Turns this round:", turnsLeft)
-
-    for i in range(len(players)):
-        tick_thread = threading.Thread(target=play_ticking, args=(roundTime,), daemon=True)
-        tick_thread.start()
-        interrupted = wait_with_timeout(roundTime)
-        tick_thread.join()
-        if interrupted:
-            print("Timer interrupted by button press!")
-            turnsLeft -= 1
-            print("Turns left:", turnsLeft)
-            print("Lives:", players)
-        else:
-            print("Timer expired! No interruption detected.")
-            players[i] -= 1
-            turnsLeft -= 1
-            print("Turns left:", turnsLeft)
-            print("Lives:", players)
+            next_tick += 0.3
+        tracing.instant(tracing.SOUND)
+        clock.wait(button_event, next_tick - clock.now())
 
-    if turnsLeft == 0:
-        print("Done with this round.")
+    if button_event.is_set() and tick_channel:
+        tick_channel.stop()
 
-    return players
+snapshots = gamestate.SnapshotWriter()
+events = eventlog.EventLog()
+stats = analytics.Analytics.load()
 
-def gameStart(playerCount, roundTime, lives):
-    players = [lives] * playerCount
-    baseRoundTime = roundTime
-    loss_threshold = 0.6
+# Share of turns the adaptive n-gram picker aims to have players beat.
+TARGET_SUCCESS = 0.75
 
-    while len([p for p in players if p != 0]) > 1:
-        players_remaining = len([p for p in players if p != 0])
-        players_lost = playerCount - players_remaining
-        loss_ratio = players_lost / playerCount
+class DeviceFrontend(engine.Frontend):
+    """Runs the engine on the OLED, the button and the speaker."""
 
-        useTrigrams = (loss_ratio >= loss_threshold) or (players_remaining == 3)
-        currentRoundTime = baseRoundTime * (players_remaining / playerCount)
+    def pick(self, state):
+        return stats.picker(list(state.roster.alive_ids()), state.round_time, TARGET_SUCCESS)
 
-        print(f"Starting a round with {players_remaining} players remaining!")
+    def round_started(self, state, ngram, loss_ratio):
+        print(f"Starting a round with {state.alive()} players remaining!")
         print(f"Loss ratio: {round(loss_ratio*100,1)}% lost")
-        print(f"Round timer is now {round(currentRoundTime,2)}s.\n")
+        print(f"Round timer is now {round(state.round_time,2)}s.\n")
 
-        if useTrigrams:
+        if state.use_trigrams:
             print("Switching to TRIGRAM images!\n")
         else:
             print("Using BIGRAM images.\n")
+        snapshots.save(state)
+        self.show(state, ngram)
 
-        players = roundStart(players, currentRoundTime, bigrams, trigrams, useTrigrams)
-        players = lifeLogic(players)
+    def round_resumed(self, state, ngram):
+        print(f"Resuming round {state.round} with lives {state.players}")
+        self.show(state, ngram)
 
-    survivors = [p for p in players if p != 0]
-    if len(survivors) == 1:
-        print(f"\nGame Over! One player remains with {survivors[0]} lives.")
-    else:
-        print("\nGame Over! No players remain.")
+    def show(self, state, ngram):
+        self.round_t0 = tracing.start()
+        if state.use_trigrams:
+            print(f"Using TRIGRAM: '{ngram}'")
+        else:
+            print(f"Using BIGRAM: '{ngram}'")
+
+        combined_img = create_letter_image(ngram)
+        if combined_img:
+            transitions.slide_in(renderer, sh1106.pack_image(combined_img, rotate=True))
+        else:
+            display_clear()
+        events.log(eventlog.NGRAM_SHOWN, value=int(state.round_time * 1000), ngram=ngram)
+        print("Turns this round:", state.alive())
+
+    def play_turn(self, state, ngram):
+        button_event.clear()
+        tick_thread = threading.Thread(target=play_ticking, args=(state.round_time,), daemon=True)
+        tick_thread.start()
+        turn_start = clock.now()
+        interrupted = wait_with_timeout(state.round_time)
+        tick_thread.join()
+        return press_time - turn_start if interrupted else None
+
+    def turn_finished(self, state, ngram, reaction, life_lost):
+        if life_lost:
+            print("Timer expired! No interruption detected.")
+            events.log(eventlog.TIMEOUT, state.turn)
+            metrics.inc("timeouts_total")
+            stats.record_timeout(ngram, state.turn)
+            events.log(eventlog.LIFE_LOST, state.turn, lives=state.players[state.turn])
+            if state.players[state.turn] == 0:
+                renderer.play(transitions.invert())
+            else:
+                renderer.play(transitions.flash())
+        else:
+            print("Timer interrupted by button press!")
+            reaction_ms = int(reaction * 1000)
+            events.log(eventlog.PRESS, state.turn, lives=state.players[state.turn],
+                       value=reaction_ms)
+            stats.record_press(ngram, state.turn, reaction_ms)
+            metrics.inc("button_presses_total")
+            metrics.observe("reaction_seconds", reaction)
+        print("Lives:", state.players)
+        snapshots.save(state)
+
+    def round_finished(self, state):
+        snapshots.save(state)
+        tracing.end(tracing.ROUND, self.round_t0)
+        print("Done with this round.")
+
+    def game_over(self, state):
+        snapshots.clear()
+        winner = state.roster.winner()
+        events.log(eventlog.GAME_END, value=-1 if winner is None else winner)
+        events.flush(sync=True)
+        metrics.inc("games_finished_total")
+        stats.last_time = time.time()
+        stats.save()
+        if winner is not None:
+            print(f"\nGame Over! Player {winner + 1} remains with {state.players[winner]} lives.")
+        else:
+            print("\nGame Over! No players remain.")
+
+def gameStart(playerCount, roundTime, lives, state=None):
+    if state is None:
+        state = gamestate.GameState(playerCount, roundTime, lives)
+        events.log(eventlog.GAME_START, lives=lives, value=playerCount)
+        metrics.inc("games_started_total")
+
+    engine.run_game(state, bigrams["top_300_bigrams"], trigrams["top_300_trigrams"],
+                    DeviceFrontend())
 
     try:
         display_clear()
         send_command([0xAE])
+        print("Render stats:", renderer.stats())
     except Exception as e:
         print("Display shutdown skipped due to GPIO cleanup:", e)
 
-    show_end_options()
-
 ###############################################################################
 # BUTTON-BASED WAIT FUNCTION
 ###############################################################################
 def wait_with_timeout(timeout):
-    global button_pressed
-    button_pressed = False
-
     print(f"Press the button within {timeout}s to interrupt (or wait to let time expire).")
-    start_time = time.time()
-
-    while (time.time() - start_time) < timeout:
-        if button_pressed:
-            return True
-        time.sleep(0.05)
+    if clock.wait(button_event, timeout):
+        metrics.observe("input_latency_seconds", clock.now() - press_time)
+        return True
 
+    tracing.instant(tracing.TIMER)
     return False
 
 ###############################################################################
 # MAIN ENTRY POINT
 ###############################################################################
 if __name__ == "__main__":
+    tracing.configure_from_env()
+    tracing.install_signal_handlers()
+    finish_metrics = metrics.start_pusher()
+    code = EXIT_MENU
     try:
-        playerCount = int(sys.argv[1]) if len(sys.argv) > 1 else 5
-        roundTime = int(sys.argv[2]) if len(sys.argv) > 2 else 5
-        lives = int(sys.argv[3]) if len(sys.argv) > 3 else 3
-        gameStart(playerCount=playerCount, roundTime=roundTime, lives=lives)
+        # Start-up only (zygote.py's benchmark): imports, hardware, letters
+        # and word lists are all set up by now.
+        if os.environ.get("NGRAM_START_ONLY"):
+            sys.exit(EXIT_MENU)
+        args = sys.argv[1:]
+        state = None
+        if args and args[0] == "--resume":
+            args = args[1:]
+            state = gamestate.load_snapshot()
+            if state is None:
+                print("No saved game to resume, starting a new one.")
+        if state is not None:
+            gameStart(state.player_count, state.base_round_time, state.start_lives, state=state)
+        else:
+            playerCount = int(args[0]) if len(args) > 0 else 5
+            roundTime = int(args[1]) if len(args) > 1 else 5
+            lives = int(args[2]) if len(args) > 2 else 3
+            gameStart(playerCount=playerCount, roundTime=roundTime, lives=lives)
+        clock.sleep(1)
+        code = show_end_options()
     except Exception as e:
+        # Leave straight away: the snapshot lets the launcher resume at once.
         print("Cause of exit:", e)
+        code = EXIT_CRASH
     finally:
-        time.sleep(1)
-        show_end_options()
-        spi.close()
+        events.close()
+        finish_metrics()
+        if tracing.enabled:
+            tracing.export_chrome()
+        renderer.stop()
+        buttons.close()
+        panel.close()
+
+    # Under the launcher its display, GPIO and menus are still up, so just
+    # report back. Run on its own, hand over to a fresh launcher process
+    # instead of nesting one inside this game.
+    if os.environ.get("NGRAM_LAUNCHER"):
+        sys.exit(code)
+    if code == EXIT_HALT:
+        os.system("sudo halt")
+    else:
+        os.execvp("python3", ["python3", "menu_launcher.py"])
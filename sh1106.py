@@ -0,0 +1,545 @@
+# sh1106.py
+"""
+Shared SH1106 (128x64 OLED) driver used by the game and the launchers.
+
+Frames are handled as 1024-byte page-major buffers: 8 pages of 128 column
+bytes, bit 0 of each byte being the top pixel of that page. Building the
+buffer is done once on the caller's side with pack_image(), so pushing a
+frame to the panel is only the bus traffic, and only for the pages that
+changed since the last frame.
+
+SPI panels come in two wirings. 4-wire SPI switches the A0 (data/command)
+pin between command bytes and data bytes. Page addressing doesn't carry on
+from one page to the next, so every page written still costs two A0
+changes (address low, data high); the driver remembers A0's level, which
+only saves the writes that wouldn't change it, such as runs of effect
+commands and display-on folded into the first page address (16 GPIO
+writes for a full frame rather than 17). 3-wire SPI (module strapped for
+it, A0 not used) tags every byte with its D/C bit instead, so a whole
+frame goes out as one transfer of 9-bit words packed into a byte stream. I2C modules
+(SH1106 or SSD1306) use SH1106I2C.
+"""
+
+import os
+import time
+
+import clock
+import metrics
+import tracing
+
+WIDTH = 128
+HEIGHT = 64
+PAGES = HEIGHT // 8
+FRAME_SIZE = WIDTH * PAGES
+
+# The SH1106 has 132 columns of RAM; 128x64 modules are wired to 2..129.
+COLUMN_OFFSET = 2
+
+BLANK_FRAME = bytes(FRAME_SIZE)
+
+###############################################################################
+# FRAME PACKING
+###############################################################################
+def _reverse_bits(value):
+    out = 0
+    for b in range(8):
+        if value & (1 << b):
+            out |= 1 << (7 - b)
+    return out
+
+# PIL packs '1' images MSB-first with 1 = white. The panel wants LSB = top
+# pixel, so both tables reverse the bits; _LIT_BLACK also inverts so dark
+# pixels light up (letter JPEGs), _LIT_WHITE lights white pixels (menus).
+_LIT_WHITE = bytes(_reverse_bits(i) for i in range(256))
+_LIT_BLACK = bytes(_reverse_bits(i ^ 0xFF) for i in range(256))
+
+def pack_image(image, rotate=False, lit_white=False):
+    """
+    Converts a PIL image to a page-major SH1106 frame buffer (bytes).
+
+    rotate turns the image 180 degrees for panels mounted upside down, and
+    lit_white selects whether white or black pixels are switched on.
+    """
+    from PIL import Image
+
+    image = image.convert('1').resize((WIDTH, HEIGHT))
+    if rotate:
+        image = image.rotate(180)
+    # After transposing, row c holds column c top-to-bottom, 8 bytes per row,
+    # so byte p of every row is exactly page p of that column.
+    transpose = getattr(Image, "Transpose", Image).TRANSPOSE
+    cols = image.transpose(transpose).tobytes()
+    frame = b"".join(cols[p::PAGES] for p in range(PAGES))
+    return frame.translate(_LIT_WHITE if lit_white else _LIT_BLACK)
+
+def frame_page(frame, page):
+    return frame[page * WIDTH:(page + 1) * WIDTH]
+
+def unpack_frame(frame):
+    """The inverse of pack_image(lit_white=True): a PIL "1" image, lit = white."""
+    from PIL import Image
+
+    rows = frame.translate(_LIT_WHITE)
+    cols = bytearray(FRAME_SIZE)
+    for p in range(PAGES):
+        cols[p::PAGES] = frame_page(rows, p)
+    transpose = getattr(Image, "Transpose", Image).TRANSPOSE
+    return Image.frombytes("1", (HEIGHT, WIDTH), bytes(cols)).transpose(transpose)
+
+def scroll_frame(frame, shift):
+    """The frame as shown with the panel displaying RAM row (y + shift) on row y."""
+    columns = []
+    for x in range(WIDTH):
+        column = int.from_bytes(frame[x::WIDTH], "little")
+        column = (column >> shift | column << (HEIGHT - shift)) & ((1 << HEIGHT) - 1)
+        columns.append(column.to_bytes(PAGES, "little"))
+    return bytes(columns[x][p] for p in range(PAGES) for x in range(WIDTH))
+
+def shown_frame(frame, start_line=0, display_offset=0, contrast=0x80, inverse=False, on=True):
+    """What the panel displays for RAM contents frame under those registers."""
+    if not on:
+        return BLANK_FRAME
+    shift = (start_line + display_offset) % HEIGHT
+    if shift:
+        frame = scroll_frame(frame, shift)
+    if inverse:
+        frame = bytes(b ^ 0xFF for b in frame)
+    return frame
+
+###############################################################################
+# 3-WIRE (9-BIT) ENCODING
+###############################################################################
+NOP = 0xE3
+
+# Each byte becomes its 9-bit word as a string of bits: D/C first, then the
+# byte MSB first. str.translate() applies these to a whole buffer in C, and
+# int(bits, 2) turns the result into the packed stream in one more step.
+_COMMAND_BITS = {b: "0" + format(b, "08b") for b in range(256)}
+_DATA_BITS = {b: "1" + format(b, "08b") for b in range(256)}
+_NOP_BITS = _COMMAND_BITS[NOP]
+
+def _bits(data, table):
+    return bytes(data).decode("latin-1").translate(table)
+
+def _pack_words(bits):
+    """9-bit words (as a bit string) to bytes, padded with NOP commands."""
+    words = len(bits) // 9
+    bits += _NOP_BITS * (-words % 8)
+    return int(bits, 2).to_bytes(len(bits) // 8, "big")
+
+def encode_9bit(commands=b"", data=b""):
+    """Commands followed by data as one 3-wire stream."""
+    return _pack_words(_bits(commands, _COMMAND_BITS) + _bits(data, _DATA_BITS))
+
+def page_address(page, column=COLUMN_OFFSET):
+    return bytes([0xB0 + page, column & 0x0F, 0x10 | (column >> 4)])
+
+def encode_frame_9bit(frame, pages=range(PAGES), column=COLUMN_OFFSET):
+    """
+    Pages of a frame, after display-on, with page addressing, as one 3-wire
+    stream.
+    """
+    data = _bits(frame, _DATA_BITS)
+    step = WIDTH * 9
+    return _pack_words(_COMMAND_BITS[0xAF] + "".join(
+        _bits(page_address(p, column), _COMMAND_BITS) + data[p * step:(p + 1) * step]
+        for p in pages))
+
+def dirty_pages(old, new):
+    """Pages that differ between two frames; all of them if old is None."""
+    if old is None:
+        return list(range(PAGES))
+    return [p for p in range(PAGES) if frame_page(old, p) != frame_page(new, p)]
+
+###############################################################################
+# PANEL
+###############################################################################
+class SH1106:
+    """
+    One SH1106 panel on SPI with RESN and, in 4-wire mode, A0 pins.
+
+    spi and gpio are passed in (spidev.SpiDev and a gpio_backend on the device)
+    so the same driver runs against fakes in tests and simulations. Set
+    column_offset=0 for SSD1306 modules, whose RAM is exactly 128 wide.
+    """
+
+    def __init__(self, spi, gpio, a0=25, resn=24, three_wire=False,
+                 column_offset=COLUMN_OFFSET):
+        self.spi = spi
+        self.gpio = gpio
+        self.a0 = a0
+        self.resn = resn
+        self.three_wire = three_wire
+        self.column_offset = column_offset
+        self._page_address = [page_address(p, column_offset) for p in range(PAGES)]
+        # Last level driven on A0, so runs of commands don't drive it again.
+        self._dc = None
+        # What the panel RAM holds, so write_frame() only sends changed pages.
+        self._shown = None
+        # writebytes2 takes bytes as they are and skips reading back.
+        self._write = getattr(spi, "writebytes2", None) or (lambda data: spi.xfer(list(data)))
+        # Mirrors of the register state set through the primitives below, so
+        # effects can restore what was there before them.
+        self.start_line = 0
+        self.display_offset = 0
+        self.contrast = 0x80
+        self.inverse = False
+        self.on = True
+
+    def reset(self):
+        self._shown = None
+        if self.resn is None:
+            return
+        self.gpio.output(self.resn, 0)
+        clock.sleep(0.1)
+        self.gpio.output(self.resn, 1)
+        clock.sleep(0.1)
+
+    def resync(self):
+        """
+        Forgets the cached A0 level and panel contents, after another
+        process drove the panel.
+        """
+        self._dc = None
+        self._shown = None
+
+    def _set_dc(self, level):
+        if self._dc != level:
+            self.gpio.output(self.a0, level)
+            self._dc = level
+
+    def send_command(self, cmd_list):
+        if self.three_wire:
+            self._write(encode_9bit(cmd_list))
+            return
+        self._set_dc(0)
+        self._write(bytes(cmd_list))
+
+    def write_frame(self, frame):
+        """Turns the display on and sends the pages that changed."""
+        started = time.perf_counter()
+        t0 = tracing.start()
+        self._write_pages(frame, dirty_pages(self._shown, frame))
+        self._shown = frame
+        self.on = True
+        tracing.end(tracing.SPI, t0)
+        metrics.observe("spi_transfer_seconds", time.perf_counter() - started)
+
+    def _write_pages(self, frame, pages):
+        if self.three_wire:
+            self._write(encode_frame_9bit(frame, pages, self.column_offset))
+            return
+        # Display on rides along with the first page address. Each page still
+        # needs A0 low for its address and high for its data.
+        on = b"\xAF"
+        for p in pages:
+            self._set_dc(0)
+            self._write(on + self._page_address[p])
+            self._set_dc(1)
+            self._write(frame_page(frame, p))
+            on = b""
+        if on:
+            self.send_command(on)
+
+    def display_off(self):
+        self.send_command([0xAE])
+        self.on = False
+
+    def display_on(self):
+        self.send_command([0xAF])
+        self.on = True
+
+    ###########################################################################
+    # CHEAP EFFECT PRIMITIVES (a few command bytes, no RAM writes)
+    ###########################################################################
+    def set_start_line(self, line):
+        """Display start line 0x40-0x7F: scrolls the RAM vertically."""
+        line %= HEIGHT
+        self.send_command([0x40 | line])
+        self.start_line = line
+
+    def set_display_offset(self, offset):
+        """Display offset 0xD3: shifts the COM mapping by offset rows."""
+        offset %= HEIGHT
+        self.send_command([0xD3, offset])
+        self.display_offset = offset
+
+    def set_contrast(self, value):
+        value = max(0, min(255, int(value)))
+        self.send_command([0x81, value])
+        self.contrast = value
+
+    def set_inverse(self, on):
+        self.send_command([0xA7 if on else 0xA6])
+        self.inverse = bool(on)
+
+    def write_page(self, page, data, column=0):
+        """Writes one page of data starting at column (0-127)."""
+        self._shown = None
+        address = page_address(page, column + self.column_offset)
+        if self.three_wire:
+            self._write(encode_9bit(address, data))
+            return
+        self.send_command(address)
+        self._set_dc(1)
+        self._write(bytes(data))
+
+    def close(self):
+        self.spi.close()
+
+class SH1106I2C(SH1106):
+    """
+    The same panel (or an SSD1306) on I2C. Every transfer starts with a
+    control byte, 0x00 for a run of commands or 0x40 for a run of data, so
+    there is no A0 pin; a frame is one command and one data message per
+    dirty page, handed to the bus together (see i2cbus.py).
+    """
+
+    def __init__(self, bus, gpio=None, resn=None, column_offset=COLUMN_OFFSET):
+        super().__init__(None, gpio, a0=None, resn=resn, column_offset=column_offset)
+        self.bus = bus
+
+    def resync(self):
+        self._shown = None
+
+    def send_command(self, cmd_list):
+        self.bus.write_many(self.bus.chunk(0x00, bytes(cmd_list)))
+
+    def _write_pages(self, frame, pages):
+        messages = []
+        on = b"\xAF"
+        for p in pages:
+            messages += self.bus.chunk(0x00, on + self._page_address[p])
+            messages += self.bus.chunk(0x40, frame_page(frame, p))
+            on = b""
+        if on:
+            messages += self.bus.chunk(0x00, on)
+        self.bus.write_many(messages)
+
+    def write_page(self, page, data, column=0):
+        self._shown = None
+        address = page_address(page, column + self.column_offset)
+        self.bus.write_many(self.bus.chunk(0x00, address) + self.bus.chunk(0x40, bytes(data)))
+
+    def close(self):
+        self.bus.close()
+
+class PanelGroup:
+    """
+    Several panels (e.g. one per side of the table on CE0 and CE1) driven
+    as one, with the SH1106 interface the render thread and effects use.
+
+    write_frame() takes either one frame, shown on every panel, or a tuple
+    with a frame per panel (None leaves that panel alone). All panels are
+    written in the same call, so on the render thread they change in the
+    same tick. Each panel keeps its own A0 level and shadow of its RAM, so
+    a frame that only changes one panel costs one panel's SPI traffic.
+    """
+
+    def __init__(self, panels):
+        self.panels = list(panels)
+
+    def write_frame(self, frame):
+        frames = frame if isinstance(frame, tuple) else (frame,) * len(self.panels)
+        for panel, own in zip(self.panels, frames):
+            if own is not None:
+                panel.write_frame(own)
+
+    def send_command(self, cmd_list):
+        for panel in self.panels:
+            panel.send_command(cmd_list)
+
+    def reset(self):
+        for panel in self.panels:
+            panel.reset()
+
+    def resync(self):
+        for panel in self.panels:
+            panel.resync()
+
+    def display_off(self):
+        for panel in self.panels:
+            panel.display_off()
+
+    def display_on(self):
+        for panel in self.panels:
+            panel.display_on()
+
+    def set_start_line(self, line):
+        for panel in self.panels:
+            panel.set_start_line(line)
+
+    def set_display_offset(self, offset):
+        for panel in self.panels:
+            panel.set_display_offset(offset)
+
+    def set_contrast(self, value):
+        for panel in self.panels:
+            panel.set_contrast(value)
+
+    def set_inverse(self, on):
+        for panel in self.panels:
+            panel.set_inverse(on)
+
+    def write_page(self, page, data, column=0):
+        for panel in self.panels:
+            panel.write_page(page, data, column)
+
+    def close(self):
+        for panel in self.panels:
+            panel.close()
+
+    # Register mirrors: the panels are always set together, so the first
+    # one speaks for all of them.
+    start_line = property(lambda self: self.panels[0].start_line)
+    display_offset = property(lambda self: self.panels[0].display_offset)
+    contrast = property(lambda self: self.panels[0].contrast)
+    inverse = property(lambda self: self.panels[0].inverse)
+    on = property(lambda self: self.panels[0].on)
+
+class MirrorPanel:
+    """
+    Base for sinks that take the SH1106 interface without being a panel:
+    the terminal mirror, the spectator stream and the recorder. It keeps
+    the frame the panel would show and mirrors of its registers, and calls
+    _frame_changed(old) and _state_changed() so the subclass can output
+    them; nothing else needs overriding.
+    """
+
+    def __init__(self):
+        self.frame = BLANK_FRAME
+        self.start_line = 0
+        self.display_offset = 0
+        self.contrast = 0x80
+        self.inverse = False
+        self.on = True
+
+    def _frame_changed(self, old):
+        """self.frame replaced old."""
+
+    def _state_changed(self):
+        """A register changed."""
+
+    def _set(self, **registers):
+        if any(getattr(self, name) != value for name, value in registers.items()):
+            for name, value in registers.items():
+                setattr(self, name, value)
+            self._state_changed()
+
+    def write_frame(self, frame):
+        """Turns the display on and takes frame."""
+        old, self.frame = self.frame, frame
+        self._set(on=True)
+        self._frame_changed(old)
+
+    def write_page(self, page, data, column=0):
+        frame = bytearray(self.frame)
+        start = page * WIDTH + column
+        frame[start:start + len(data)] = data
+        old, self.frame = self.frame, bytes(frame)
+        self._frame_changed(old)
+
+    def send_command(self, cmd_list):
+        # The raw commands the scripts send directly: on/off and inverse.
+        for cmd in cmd_list:
+            if cmd in (0xAE, 0xAF):
+                self._set(on=cmd == 0xAF)
+            elif cmd in (0xA6, 0xA7):
+                self._set(inverse=cmd == 0xA7)
+
+    def reset(self):
+        pass
+
+    def resync(self):
+        pass
+
+    def display_off(self):
+        self._set(on=False)
+
+    def display_on(self):
+        self._set(on=True)
+
+    def set_start_line(self, line):
+        self._set(start_line=line % HEIGHT)
+
+    def set_display_offset(self, offset):
+        self._set(display_offset=offset % HEIGHT)
+
+    def set_contrast(self, value):
+        self._set(contrast=max(0, min(255, int(value))))
+
+    def set_inverse(self, on):
+        self._set(inverse=bool(on))
+
+    def close(self):
+        pass
+
+def open_spi_panel(bus=0, device=0, a0=25, resn=24, speed_hz=1000000, three_wire=False,
+                   gpio=None):
+    """
+    Sets up the GPIO pins and spidev handle and returns an SH1106. gpio
+    defaults to gpio_backend.open_gpio(); 3-wire mode is also picked by
+    setting NGRAM_SPI_3WIRE=1.
+    """
+    import spidev
+    import gpio_backend
+
+    GPIO = gpio or gpio_backend.open_gpio()
+    three_wire = three_wire or os.environ.get("NGRAM_SPI_3WIRE", "") not in ("", "0")
+    if not three_wire:
+        GPIO.setup(a0, GPIO.OUT, initial=GPIO.HIGH)
+    GPIO.setup(resn, GPIO.OUT, initial=GPIO.HIGH)
+
+    spi = spidev.SpiDev()
+    spi.open(bus, device)
+    spi.max_speed_hz = speed_hz
+    spi.mode = 0b00
+    return SH1106(spi, GPIO, a0=a0, resn=resn, three_wire=three_wire)
+
+def open_i2c_panel(bus=1, address=0x3C, controller="sh1106", resn=None, gpio=None,
+                   max_chunk=None):
+    """
+    Opens /dev/i2c-<bus> and returns an SH1106I2C. controller="ssd1306"
+    drops the column offset and switches the SSD1306's charge pump on. The
+    bus rate (400 kHz or 1 MHz) is set by the kernel, e.g. with
+    dtparam=i2c_arm_baudrate=1000000 in config.txt; see i2cbus.bus_speed().
+    """
+    import gpio_backend
+    import i2cbus
+
+    if resn is not None:
+        gpio = gpio or gpio_backend.open_gpio()
+        gpio.setup(resn, gpio.OUT, initial=gpio.HIGH)
+    i2c = i2cbus.I2CBus(bus, address, max_chunk=max_chunk or i2cbus.MAX_CHUNK)
+    if controller == "ssd1306":
+        panel = SH1106I2C(i2c, gpio, resn=resn, column_offset=0)
+        panel.send_command([0x8D, 0x14])
+    else:
+        panel = SH1106I2C(i2c, gpio, resn=resn)
+    return panel
+
+def open_panels(spec=None, a0=25, resn=24, gpio=None, **options):
+    """
+    Opens the panels listed in spec, or in NGRAM_PANELS, as a PanelGroup:
+    "device:a0:resn" per panel, comma separated, e.g. "0:25:24,1:23:18"
+    for panels on CE0 and CE1. "term" or "term:/dev/pts/N" adds a braille
+    mirror (see termdisplay.py), "udp" or "udp:host:port" a network
+    spectator stream (see spectator.py). With neither set, returns the single CE0
+    panel on the given pins.
+    """
+    spec = spec or os.environ.get("NGRAM_PANELS", "")
+    if not spec:
+        return open_spi_panel(a0=a0, resn=resn, gpio=gpio, **options)
+    panels = []
+    for entry in spec.split(","):
+        if entry.startswith("term"):
+            import termdisplay
+            panels.append(termdisplay.open_terminal(entry.partition(":")[2]))
+            continue
+        if entry.startswith("udp"):
+            import spectator
+            panels.append(spectator.open_spectator(entry.partition(":")[2]))
+            continue
+        device, a0, resn = (int(v) for v in entry.split(":"))
+        panels.append(open_spi_panel(device=device, a0=a0, resn=resn, gpio=gpio, **options))
+    return PanelGroup(panels)
@@ -0,0 +1,234 @@
+# simulate.py
+"""
+Headless simulation for tuning the game's difficulty knobs.
+
+Plays games through the same engine as the device, but with synthetic
+players, a fake display and a virtual clock: turns advance the clock by the
+sampled reaction time instead of sleeping, so a game takes microseconds.
+Games are spread over a process pool.
+
+    python3 simulate.py --games 20000 --players 5 --lives 3 --round-time 5 \\
+        --loss-threshold 0.6 --time-scaling 1.0
+
+Prints the distribution of game lengths and the elimination curve (share of
+players still in after each round).
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import time
+
+import engine
+import gamestate
+from clock import VirtualClock
+
+###############################################################################
+# FAKE HARDWARE
+###############################################################################
+class FakeDisplay:
+    def __init__(self):
+        self.shown = 0
+        self.ngram = None
+
+    def show(self, ngram):
+        self.shown += 1
+        self.ngram = ngram
+
+class SyntheticPlayer:
+    """Log-normal reaction times around a per-player median (seconds)."""
+
+    def __init__(self, median, sigma, trigram_factor, rng):
+        self.median = median
+        self.sigma = sigma
+        self.trigram_factor = trigram_factor
+        self.rng = rng
+
+    def reaction(self, ngram):
+        median = self.median * (self.trigram_factor if len(ngram) == 3 else 1.0)
+        return self.rng.lognormvariate(math.log(median), self.sigma)
+
+class PressFlag:
+    """The bits of threading.Event that clock.wait() needs, minus the locks."""
+
+    __slots__ = ("pressed",)
+
+    def __init__(self):
+        self.pressed = False
+
+    def set(self):
+        self.pressed = True
+
+    def clear(self):
+        self.pressed = False
+
+    def is_set(self):
+        return self.pressed
+
+class Stalemate(Exception):
+    """Raised to abandon a game that runs past the round limit."""
+
+class SimFrontend(engine.Frontend):
+
+    def __init__(self, players, clock, display, max_rounds):
+        self.players = players
+        self.max_rounds = max_rounds
+        self.clock = clock
+        self.display = display
+        self.button = PressFlag()
+        self.turns = 0
+        self.trigram_rounds = 0
+        self.eliminated_in = []
+
+    def round_started(self, state, ngram, loss_ratio):
+        if state.round > self.max_rounds:
+            raise Stalemate()
+        self.display.show(ngram)
+        self.trigram_rounds += state.use_trigrams
+
+    def play_turn(self, state, ngram):
+        # Same shape as the device: the player "presses" through a timer on
+        # the virtual clock while the turn waits on the button with a timeout.
+        self.turns += 1
+        self.button.clear()
+        start = self.clock.now()
+        press = self.clock.call_later(self.players[state.turn].reaction(ngram),
+                                      self.button.set)
+        if self.clock.wait(self.button, state.round_time):
+            return self.clock.now() - start
+        press.cancel()
+        return None
+
+    def turn_finished(self, state, ngram, reaction, life_lost):
+        if life_lost and not state.roster.is_alive(state.turn):
+            self.eliminated_in.append(state.round)
+
+###############################################################################
+# WORKERS
+###############################################################################
+_ngrams = None
+
+def _load_ngrams():
+    global _ngrams
+    if _ngrams is None:
+        with open("top_300_bigrams.json") as f:
+            bigrams = json.load(f)["top_300_bigrams"]
+        with open("top_300_trigrams.json") as f:
+            trigrams = json.load(f)["top_300_trigrams"]
+        _ngrams = bigrams, trigrams
+    return _ngrams
+
+def play_batch(config, seed, count):
+    """
+    Plays count games and returns (rounds, turns, seconds, trigram rounds,
+    elimination rounds, finished) for each.
+    """
+    bigrams, trigrams = _load_ngrams()
+    rng = random.Random(seed)
+    results = []
+    for _ in range(count):
+        players = [SyntheticPlayer(rng.lognormvariate(math.log(config["median"]),
+                                                      config["skill_spread"]),
+                                   config["sigma"], config["trigram_factor"], rng)
+                   for _ in range(config["players"])]
+        clock = VirtualClock()
+        frontend = SimFrontend(players, clock, FakeDisplay(), config["max_rounds"])
+        state = gamestate.GameState(config["players"], config["round_time"],
+                                    config["lives"], seed=rng.getrandbits(32),
+                                    loss_threshold=config["loss_threshold"],
+                                    time_scaling=config["time_scaling"])
+        try:
+            engine.run_game(state, bigrams, trigrams, frontend)
+            finished = True
+        except Stalemate:
+            finished = False
+        results.append((state.round, frontend.turns, clock.now(),
+                        frontend.trigram_rounds, frontend.eliminated_in, finished))
+    return results
+
+def simulate(config, games, workers=None, batch=500, seed=0):
+    jobs = [(config, seed + i, min(batch, games - i * batch))
+            for i in range((games + batch - 1) // batch)]
+    with multiprocessing.Pool(workers) as pool:
+        batches = pool.starmap(play_batch, jobs)
+    return [r for b in batches for r in b]
+
+###############################################################################
+# REPORT
+###############################################################################
+def _percentiles(values, points=(10, 50, 90)):
+    ordered = sorted(values)
+    return [ordered[min(len(ordered) - 1, len(ordered) * p // 100)] for p in points]
+
+def report(config, results, elapsed):
+    rounds = [r[0] for r in results]
+    minutes = [r[2] / 60 for r in results]
+    print(f"{len(results)} games in {elapsed:.1f}s "
+          f"({len(results) / elapsed * 60:,.0f} games/min)")
+    print(f"Rounds per game: mean {sum(rounds) / len(rounds):.1f}, "
+          "p10/p50/p90 %s" % "/".join(str(p) for p in _percentiles(rounds)))
+    print(f"Game length:     mean {sum(minutes) / len(minutes):.1f} min, "
+          "p10/p50/p90 %s min" % "/".join(f"{p:.1f}" for p in _percentiles(minutes)))
+    trigram_share = sum(r[3] for r in results) / sum(rounds)
+    print(f"Trigram rounds:  {trigram_share:.0%}")
+    unfinished = sum(1 for r in results if not r[5])
+    if unfinished:
+        print(f"Unfinished:      {unfinished} games hit --max-rounds "
+              f"{config['max_rounds']}")
+
+    print("\nRounds  games")
+    longest = max(rounds)
+    width = max(1, longest // 20)
+    for start in range(1, longest + 1, width):
+        n = sum(1 for r in rounds if start <= r < start + width)
+        print(f"{start:>3}-{start + width - 1:<3} {n:>6} {'#' * (60 * n // len(rounds))}")
+
+    print("\nRound  players still in")
+    players = config["players"]
+    for rnd in range(1, min(longest, 40) + 1):
+        out = sum(sum(1 for e in r[4] if e <= rnd) for r in results)
+        share = 1 - out / (players * len(results))
+        print(f"{rnd:>5}  {share:6.1%} {'#' * int(50 * share)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=5)
+    parser.add_argument("--lives", type=int, default=3)
+    parser.add_argument("--round-time", type=float, default=5)
+    parser.add_argument("--loss-threshold", type=float, default=gamestate.LOSS_THRESHOLD)
+    parser.add_argument("--time-scaling", type=float, default=gamestate.TIME_SCALING)
+    parser.add_argument("--median", type=float, default=2.0,
+                        help="median reaction time of an average player (s)")
+    parser.add_argument("--sigma", type=float, default=0.5,
+                        help="log-normal spread of one player's reactions")
+    parser.add_argument("--skill-spread", type=float, default=0.3,
+                        help="log-normal spread of medians between players")
+    parser.add_argument("--trigram-factor", type=float, default=1.4,
+                        help="how much slower trigrams are than bigrams")
+    parser.add_argument("--max-rounds", type=int, default=300,
+                        help="abandon games that run longer than this")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = {
+        "players": args.players,
+        "lives": args.lives,
+        "round_time": args.round_time,
+        "loss_threshold": args.loss_threshold,
+        "time_scaling": args.time_scaling,
+        "median": args.median,
+        "sigma": args.sigma,
+        "skill_spread": args.skill_spread,
+        "trigram_factor": args.trigram_factor,
+        "max_rounds": args.max_rounds,
+    }
+    started = time.perf_counter()
+    results = simulate(config, args.games, args.workers, seed=args.seed)
+    report(config, results, time.perf_counter() - started)
+
+if __name__ == "__main__":
+    main()
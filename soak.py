@@ -0,0 +1,293 @@
+# soak.py
+"""
+Soak test: thousands of back-to-back games through the launcher flow, on
+fake hardware, watching for resources that leak from game to game.
+
+    python3 soak.py --games 200 --speed 400     # about two minutes
+
+The launcher's main() runs as usual, but with fakehw's GPIO, SPI and mixer,
+a clock running speed times faster, and each game run in this process (the
+script is executed afresh, like a new process would) instead of a child. A
+bot works the menus and presses the game button at random. Anything a game
+opens and doesn't give back therefore piles up here. The bot's presses
+are spread around the round time of the launcher's default speed (10 s),
+so turns are missed often enough for games to end: a game is a few dozen
+turns, well under a second at --speed 400.
+
+Every few games it samples RSS, open fds, threads, tracemalloc's traced
+heap and the fake board's open handles. The first --warmup share of games
+is ignored (caches and the analytics table fill up); after that, if the
+peak in the second half of the run is above the peak in the first half by
+more than the allowed slack, the resource is reported as leaking, the top
+tracemalloc allocators are printed, and the exit status is 1.
+"""
+
+import argparse
+import contextlib
+import gc
+import math
+import os
+import random
+import runpy
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from PIL import Image, ImageDraw, ImageFont
+
+import fakehw
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ASSETS = ("top_300_bigrams.json", "top_300_trigrams.json",
+          "ding.wav", "tick.wav", "tick_fast.wav")
+
+###############################################################################
+# SCRATCH DIRECTORY
+###############################################################################
+def make_scratch():
+    """
+    A working directory with the game's assets, so logs, snapshots and the
+    analytics table don't touch the real ones.
+    """
+    scratch = tempfile.mkdtemp(prefix="ngram-soak-")
+    for name in ASSETS:
+        os.symlink(os.path.join(HERE, name), os.path.join(scratch, name))
+    os.mkdir(os.path.join(scratch, "letters"))
+    font = ImageFont.load_default()
+    for i in range(65, 91):
+        img = Image.new("L", (40, 64), 255)
+        ImageDraw.Draw(img).text((16, 26), chr(i), font=font, fill=0)
+        img.save(os.path.join(scratch, "letters", f"{chr(i)}.jpg"))
+    return scratch
+
+###############################################################################
+# SAMPLING
+###############################################################################
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+def sample(games, board):
+    gc.collect()
+    row = {
+        "games": games,
+        "rss": rss_bytes(),
+        "fds": open_fds(),
+        "threads": threading.active_count(),
+        "heap": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0,
+    }
+    row.update(board.counts())
+    return row
+
+# Growth allowed between the two halves of the run before it counts as a leak.
+def limits(args):
+    return {
+        "rss": args.rss_slack * 1024 * 1024,
+        "heap": args.heap_slack * 1024 * 1024,
+        "fds": 2,
+        "threads": 2,
+        "spi_open": 0,
+        "edge_callbacks": 0,
+        "mixer_inits": 1,
+        "sounds_live": 4,
+    }
+
+def leaks(samples, warmup, allowed):
+    """Returns {resource: (first-half peak, second-half peak)} for leaking ones."""
+    steady = [s for s in samples if s["games"] > warmup]
+    if len(steady) < 4:
+        return {}
+    half = len(steady) // 2
+    found = {}
+    for name, slack in allowed.items():
+        before = max(s[name] for s in steady[:half])
+        after = max(s[name] for s in steady[half:])
+        if after - before > slack:
+            found[name] = (before, after)
+    return found
+
+def _fmt(name, value):
+    if name in ("rss", "heap"):
+        return f"{value / 1048576:.1f}M"
+    return str(value)
+
+###############################################################################
+# BOT
+###############################################################################
+class Bot:
+    """
+    Plays the launcher: answers menus, presses the game button at random
+    while a game is on, and runs the game script in-process.
+    """
+
+    def __init__(self, board, launcher, clock, target, median, sample_every):
+        self.board = board
+        self.launcher = launcher
+        self.clock = clock
+        self.target = target
+        self.median = median
+        self.sample_every = sample_every
+        self.rng = random.Random(0)
+        self.playing = False
+        self._pressing = threading.Lock()
+        self.done = False
+        self.games = 0
+        self.crashes = 0
+        self.samples = []
+        self.baseline = None
+        self.warmup = 0
+        self.script = os.path.join(HERE, launcher.GAME_SCRIPT)
+        self.launcher_gpio = sys.modules["RPi.GPIO"]
+
+    def answer(self, buttons, options):
+        """Called whenever something blocks on buttons."""
+        if options is None or "C" in options:
+            # Launcher menus: B moves on (and goes back to the menu after a crash).
+            label = "B"
+        else:
+            # The game's end screen: A for another game, B to halt and stop.
+            # A random press from the last turn can still be queued and would
+            # be read as A, starting a game past the target: drop it.
+            with self._pressing:
+                self.playing = False
+            buttons.clear()
+            label = "B" if self.games >= self.target else "A"
+        self.clock.call_later(0.2, lambda: self.board.press(label))
+
+    def press_at_random(self):
+        while not self.done:
+            self.clock.sleep(self.rng.lognormvariate(math.log(self.median), 0.6))
+            with self._pressing:
+                if self.playing:
+                    self.board.press("A")
+
+    def launch(self, args):
+        resume = list(args[:1]) == ["--resume"]
+        if resume:
+            self.crashes += 1
+        else:
+            self.games += 1
+
+        # A fresh GPIO module per game, as a new process would get.
+        fakehw.use_gpio(self.board.gpio())
+        argv = sys.argv
+        sys.argv = [self.script, *map(str, args)]
+        self.playing = True
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                runpy.run_path(self.script, run_name="__main__")
+            code = self.launcher.EXIT_MENU
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else self.launcher.EXIT_CRASH
+        finally:
+            self.playing = False
+            sys.argv = argv
+            fakehw.use_gpio(self.launcher_gpio)
+
+        if not resume and (self.games % self.sample_every == 0 or self.games == self.target):
+            self.record()
+        return code
+
+    def record(self):
+        row = sample(self.games, self.board)
+        self.samples.append(row)
+        if self.baseline is None and self.games >= self.warmup and tracemalloc.is_tracing():
+            self.baseline = tracemalloc.take_snapshot()
+        print(f"{row['games']:>6} games  rss {_fmt('rss', row['rss']):>7}  "
+              f"heap {_fmt('heap', row['heap']):>7}  fds {row['fds']:>3}  "
+              f"threads {row['threads']:>2}  spi {row['spi_open']}  "
+              f"edges {row['edge_callbacks']}  sounds {row['sounds_live']}  "
+              f"crashes {self.crashes}", flush=True)
+
+###############################################################################
+# MAIN
+###############################################################################
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--speed", type=float, default=400,
+                        help="how much faster than real time the clock runs")
+    parser.add_argument("--median", type=float, default=6.0,
+                        help="median seconds between random presses (game time); "
+                             "well under the round time and games barely end")
+    parser.add_argument("--sample-every", type=int, default=20)
+    parser.add_argument("--warmup", type=float, default=0.2,
+                        help="share of games ignored while caches fill")
+    parser.add_argument("--rss-slack", type=float, default=8,
+                        help="MB of RSS growth tolerated")
+    parser.add_argument("--heap-slack", type=float, default=2,
+                        help="MB of traced heap growth tolerated")
+    parser.add_argument("--no-tracemalloc", action="store_true")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the scratch directory")
+    args = parser.parse_args()
+
+    board = fakehw.install()
+    scratch = make_scratch()
+    os.chdir(scratch)
+    # Games run in this process: tell them to report back, not exec a launcher.
+    os.environ["NGRAM_LAUNCHER"] = "1"
+
+    import clock
+    import idle
+    import menu_launcher
+    import metrics
+
+    metrics.SOCKET_PATH = os.path.join(scratch, "metrics.sock")
+    fast = clock.ScaledClock(args.speed)
+    clock.use(fast)
+
+    if not args.no_tracemalloc:
+        tracemalloc.start()
+
+    bot = Bot(board, menu_launcher, fast, args.games, args.median, args.sample_every)
+    bot.warmup = int(args.games * args.warmup)
+
+    get = idle.IdleManager.get
+
+    def answered_get(self, options=None):
+        bot.answer(self.buttons, options)
+        return get(self, options)
+
+    idle.IdleManager.get = answered_get
+    menu_launcher.launch = bot.launch
+    menu_launcher.halt = lambda: None
+    # Games run in this process, so there is nothing for a zygote to fork.
+    os.environ["NGRAM_ZYGOTE"] = "0"
+
+    presser = threading.Thread(target=bot.press_at_random, name="soak-presser", daemon=True)
+    presser.start()
+    started = time.monotonic()
+    try:
+        menu_launcher.main()
+    finally:
+        bot.done = True
+        if not args.keep:
+            os.chdir(HERE)
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    elapsed = time.monotonic() - started
+    print(f"\n{bot.games} games ({bot.crashes} resumed after a crash) "
+          f"in {elapsed:.0f}s")
+
+    found = leaks(bot.samples, bot.warmup, limits(args))
+    if bot.baseline is not None and found:
+        print("\nTop allocators since warm-up:")
+        for stat in tracemalloc.take_snapshot().compare_to(bot.baseline, "lineno")[:10]:
+            print("  ", stat)
+
+    if not found:
+        print("No leaks: every resource stayed within its slack.")
+        return 0
+    for name, (before, after) in found.items():
+        print(f"LEAK {name}: peak {_fmt(name, before)} -> {_fmt(name, after)}")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
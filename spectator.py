@@ -0,0 +1,231 @@
+# spectator.py
+"""
+Network spectator stream of the panel, for a big screen at events.
+
+SpectatorPanel has the SH1106 interface and sends what the panel is sent
+as UDP datagrams, so it goes in a PanelGroup next to the real panel, via
+NGRAM_PANELS:
+
+    NGRAM_PANELS=0:25:24,udp                    # multicast to the LAN
+    NGRAM_PANELS=0:25:24,udp:127.0.0.1:4078     # one viewer
+
+Each datagram is a 6-byte header (magic "NS", kind, frame sequence
+number, page) and a payload: one 128-byte page that changed, or the five
+display registers when one of them changes. Every REFRESH_SECONDS a timer
+of its own (clock.call_later) sends all pages and the registers again,
+whether or not anything was drawn, so a viewer that joins late or lost a
+datagram catches up even on a screen that stays put. The socket is non-blocking and a datagram
+that can't be sent at once is dropped, so the render thread never waits
+on the network.
+
+    python3 spectator.py                       # viewer, multicast group
+    python3 spectator.py --listen 127.0.0.1:4078 --scale 8
+"""
+
+import argparse
+import socket
+import struct
+import threading
+
+import clock
+import sh1106
+
+GROUP = "239.255.78.71"
+PORT = 4078
+TTL = 1
+MAGIC = b"NS"
+HEADER = struct.Struct("<2sBHB")
+REGISTERS = struct.Struct("<BBBBB")
+PAGE, STATE = 1, 2
+REFRESH_SECONDS = 1.0
+
+def parse_address(text):
+    """"host:port", "host" or "" as a (host, port) pair, defaults filled in."""
+    host, _, port = text.partition(":")
+    return host or GROUP, int(port or PORT)
+
+def is_multicast(host):
+    try:
+        return 224 <= int(socket.inet_aton(host)[0]) <= 239
+    except OSError:
+        return False
+
+###############################################################################
+# PUBLISHER
+###############################################################################
+class SpectatorPanel(sh1106.MirrorPanel):
+
+    def __init__(self, address=(GROUP, PORT)):
+        super().__init__()
+        self.address = address
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        if is_multicast(address[0]):
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, TTL)
+        self.seq = 0
+        self.sent = 0
+        self.dropped = 0
+        # The refresh timer sends from its own thread.
+        self._lock = threading.Lock()
+        self._timer = clock.call_later(REFRESH_SECONDS, self._refresh)
+
+    def _send(self, kind, index, payload):
+        try:
+            self.sock.sendto(HEADER.pack(MAGIC, kind, self.seq, index) + payload, self.address)
+            self.sent += 1
+        except OSError:
+            # Full socket buffer, no route, ...: the next refresh makes up for it.
+            self.dropped += 1
+
+    def _send_state(self):
+        self._send(STATE, 0, REGISTERS.pack(self.start_line, self.display_offset,
+                                            self.contrast, self.inverse, self.on))
+
+    def _send_all(self):
+        self._send_state()
+        for p in range(sh1106.PAGES):
+            self._send(PAGE, p, sh1106.frame_page(self.frame, p))
+
+    def _refresh(self):
+        with self._lock:
+            if self._timer is None:
+                return
+            self._send_all()
+            self._timer = clock.call_later(REFRESH_SECONDS, self._refresh)
+
+    def _frame_changed(self, old):
+        with self._lock:
+            self.seq = (self.seq + 1) & 0xFFFF
+            for p in sh1106.dirty_pages(old, self.frame):
+                self._send(PAGE, p, sh1106.frame_page(self.frame, p))
+
+    def _state_changed(self):
+        with self._lock:
+            self._send_state()
+
+    def resync(self):
+        with self._lock:
+            self._send_all()
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.sock.close()
+
+def open_spectator(address=""):
+    """A SpectatorPanel sending to "host:port" (default: the multicast group)."""
+    return SpectatorPanel(parse_address(address))
+
+###############################################################################
+# VIEWER
+###############################################################################
+def _newer(seq, than):
+    return 0 < (seq - than) & 0xFFFF < 0x8000
+
+class Receiver:
+    """Rebuilds the panel from the datagrams: frame and registers."""
+
+    def __init__(self, address=(GROUP, PORT)):
+        host, port = address
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if is_multicast(host):
+            self.sock.bind(("", port))
+            membership = struct.pack("4s4s", socket.inet_aton(host), socket.inet_aton("0.0.0.0"))
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        else:
+            self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.frame = bytearray(sh1106.FRAME_SIZE)
+        self.registers = (0, 0, 0x80, False, True)
+        self._page_seq = [None] * sh1106.PAGES
+        self._state_seq = None
+        self.received = 0
+
+    def poll(self):
+        """Applies every datagram waiting; returns whether anything changed."""
+        changed = False
+        while True:
+            try:
+                data = self.sock.recv(HEADER.size + sh1106.WIDTH)
+            except BlockingIOError:
+                return changed
+            if len(data) < HEADER.size:
+                continue
+            magic, kind, seq, index = HEADER.unpack_from(data)
+            payload = data[HEADER.size:]
+            if magic != MAGIC:
+                continue
+            self.received += 1
+            # A datagram overtaken by a newer one for the same page is stale.
+            if kind == PAGE and index < sh1106.PAGES and len(payload) == sh1106.WIDTH:
+                if self._page_seq[index] is None or not _newer(self._page_seq[index], seq):
+                    self._page_seq[index] = seq
+                    start = index * sh1106.WIDTH
+                    self.frame[start:start + sh1106.WIDTH] = payload
+                    changed = True
+            elif kind == STATE and len(payload) == REGISTERS.size:
+                if self._state_seq is None or not _newer(self._state_seq, seq):
+                    self._state_seq = seq
+                    line, offset, contrast, inverse, on = REGISTERS.unpack(payload)
+                    self.registers = (line, offset, contrast, bool(inverse), bool(on))
+                    changed = True
+
+    def shown(self):
+        return sh1106.shown_frame(bytes(self.frame), *self.registers)
+
+    def close(self):
+        self.sock.close()
+
+def _pgm(frame):
+    """The frame as a binary PGM, which Tk's PhotoImage reads without PIL."""
+    rows = bytearray(sh1106.WIDTH * sh1106.HEIGHT)
+    for page in range(sh1106.PAGES):
+        data = sh1106.frame_page(frame, page)
+        for bit in range(8):
+            row = (page * 8 + bit) * sh1106.WIDTH
+            rows[row:row + sh1106.WIDTH] = bytes(255 if b >> bit & 1 else 0 for b in data)
+    return b"P5 %d %d 255\n" % (sh1106.WIDTH, sh1106.HEIGHT) + bytes(rows)
+
+def view(receiver, scale=6):
+    import tkinter
+
+    root = tkinter.Tk()
+    root.title("n-gram spectator")
+    root.configure(background="black")
+    label = tkinter.Label(root, borderwidth=0, background="black")
+    label.pack(expand=True)
+    root.bind("<Escape>", lambda event: root.destroy())
+    root.bind("f", lambda event: root.attributes("-fullscreen",
+                                                 not root.attributes("-fullscreen")))
+
+    def redraw():
+        image = tkinter.PhotoImage(data=_pgm(receiver.shown())).zoom(scale)
+        label.configure(image=image)
+        label.image = image
+
+    def readable(sock, mask):
+        if receiver.poll():
+            redraw()
+
+    redraw()
+    # Tk's event loop wakes on the socket; there is no polling timer.
+    root.tk.createfilehandler(receiver.sock, tkinter.READABLE, readable)
+    root.mainloop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--listen", default="", help="host:port (default: multicast group)")
+    parser.add_argument("--scale", type=int, default=6)
+    args = parser.parse_args()
+
+    receiver = Receiver(parse_address(args.listen))
+    try:
+        view(receiver, args.scale)
+    finally:
+        receiver.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# termdisplay.py
+"""
+Terminal mirror of the 128x64 panel in Unicode braille.
+
+Each braille cell holds 2x4 pixels, so the panel is 64x16 cells. After the
+first frame only the cells that changed are written, each run preceded by
+an ANSI cursor move, so an update costs a few hundred bytes and mirroring
+works over SSH or a slow serial console.
+
+TerminalPanel has the SH1106 interface, so it can stand in for the panel or
+sit next to it in a PanelGroup. With sh1106.open_panels() that is an entry
+in NGRAM_PANELS:
+
+    NGRAM_PANELS=0:25:24,term              # OLED plus this terminal
+    NGRAM_PANELS=0:25:24,term:/dev/pts/3   # mirror to another terminal
+
+Inverse video, the display on/off state and the start-line/offset scrolls
+used by transitions.py are reproduced; contrast is not.
+"""
+
+import sys
+
+import sh1106
+
+COLS = sh1106.WIDTH // 2
+ROWS = sh1106.HEIGHT // 4
+
+# Braille dot bits for the four rows of the left and right pixel columns.
+_LEFT_DOTS = (0x01, 0x02, 0x04, 0x40)
+_RIGHT_DOTS = (0x08, 0x10, 0x20, 0x80)
+
+def _dots(nibble, dots):
+    return sum(bit for i, bit in enumerate(dots) if nibble >> i & 1)
+
+_LEFT = [_dots(n, _LEFT_DOTS) for n in range(16)]
+_RIGHT = [_dots(n, _RIGHT_DOTS) for n in range(16)]
+
+# Runs of changed cells closer than this are sent as one, since a cursor
+# move costs about as much as re-sending a few unchanged cells.
+MERGE_GAP = 3
+
+###############################################################################
+# FRAME -> CELLS
+###############################################################################
+def cells(frame, shift=0, inverse=False):
+    """The frame as ROWS strings of COLS braille characters."""
+    if shift:
+        frame = sh1106.scroll_frame(frame, shift)
+    if inverse:
+        frame = bytes(b ^ 0xFF for b in frame)
+    rows = []
+    for page in range(sh1106.PAGES):
+        data = sh1106.frame_page(frame, page)
+        left, right = data[0::2], data[1::2]
+        # A page is two rows of cells: its low nibbles, then its high ones.
+        rows.append("".join(chr(0x2800 | _LEFT[l & 15] | _RIGHT[r & 15])
+                            for l, r in zip(left, right)))
+        rows.append("".join(chr(0x2800 | _LEFT[l >> 4] | _RIGHT[r >> 4])
+                            for l, r in zip(left, right)))
+    return rows
+
+def diff(old, new, top=1, left=1):
+    """ANSI text that turns the cell rows old into new on screen."""
+    out = []
+    for y, (was, now) in enumerate(zip(old, new)):
+        if was == now:
+            continue
+        x = 0
+        while x < COLS:
+            if was[x] == now[x]:
+                x += 1
+                continue
+            end = x + 1
+            while end < COLS:
+                if was[end] != now[end]:
+                    end += 1
+                elif any(was[i] != now[i] for i in range(end, min(end + MERGE_GAP + 1, COLS))):
+                    end += 1
+                else:
+                    break
+            out.append(f"\x1b[{top + y};{left + x}H{now[x:end]}")
+            x = end
+    return "".join(out)
+
+###############################################################################
+# PANEL
+###############################################################################
+class TerminalPanel(sh1106.MirrorPanel):
+
+    def __init__(self, out=None, top=1, left=1):
+        super().__init__()
+        self.out = out or sys.stdout
+        self.top = top
+        self.left = left
+        self._screen = None
+        self.bytes_written = 0
+
+    def _redraw(self):
+        if self.on:
+            shift = (self.start_line + self.display_offset) % sh1106.HEIGHT
+            rows = cells(self.frame, shift, self.inverse)
+        else:
+            rows = [chr(0x2800) * COLS] * ROWS
+        if self._screen is None:
+            text = "\x1b[?25l" + diff([" " * COLS] * ROWS, rows, self.top, self.left)
+        else:
+            text = diff(self._screen, rows, self.top, self.left)
+        self._screen = rows
+        if text:
+            self.out.write(text)
+            self.out.flush()
+            self.bytes_written += len(text.encode())
+
+    def _frame_changed(self, old):
+        self._redraw()
+
+    def _state_changed(self):
+        # Contrast isn't shown, so changing it leaves nothing to write.
+        self._redraw()
+
+    def resync(self):
+        """Redraws everything on the next frame (e.g. after the terminal was cleared)."""
+        self._screen = None
+
+    def close(self):
+        self.out.write(f"\x1b[{self.top + ROWS};1H\x1b[?25h")
+        self.out.flush()
+        if self.out not in (sys.stdout, sys.stderr):
+            self.out.close()
+
+def open_terminal(path=None):
+    """A TerminalPanel on stdout, or on the terminal device at path."""
+    if path:
+        return TerminalPanel(open(path, "w", encoding="utf-8"))
+    return TerminalPanel()
+
+if __name__ == "__main__":
+    # Demo: python3 termdisplay.py shows a checkerboard sliding in.
+    import time
+
+    panel = TerminalPanel()
+    panel.out.write("\x1b[2J")
+    board = bytes((0x0F if (x // 4 + p) % 2 else 0xF0) for p in range(sh1106.PAGES)
+                  for x in range(sh1106.WIDTH))
+    panel.write_frame(board)
+    for line in range(0, 33, 4):
+        panel.set_start_line(32 - line)
+        time.sleep(0.05)
+    panel.set_inverse(True)
+    time.sleep(0.5)
+    panel.close()
+    print(f"{panel.bytes_written} bytes written", file=sys.stderr)
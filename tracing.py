@@ -0,0 +1,110 @@
+# tracing.py
+"""
+Low-overhead span tracing for the display, input, audio and round logic.
+
+Spans go into a preallocated ring buffer (parallel arrays, no allocation per
+event) and can be exported as Chrome trace-event JSON, to open in
+chrome://tracing or https://ui.perfetto.dev.
+
+    t0 = tracing.start()
+    ...
+    tracing.end(tracing.SPI, t0)
+
+While tracing is off, start() returns 0 and end() returns straight away, so
+the hooks can stay in the hot paths. Tracing is switched with enable(), the
+NGRAM_TRACE environment variable (set by the launcher), or at runtime with
+SIGUSR1 (toggle) and SIGUSR2 (write the trace file) once
+install_signal_handlers() has been called.
+"""
+
+import itertools
+import json
+import os
+import signal
+import threading
+import time
+from array import array
+
+RENDER, SPI, SOUND, INPUT, TIMER, ROUND, LETTERS = range(7)
+NAMES = ("render", "spi_transfer", "sound_start", "input_edge",
+         "timer_expiry", "round", "create_letter_image")
+
+TRACE_PATH = "trace.json"
+CAPACITY = 16384
+
+enabled = False
+
+_starts = array("q", bytes(8 * CAPACITY))
+_durations = array("q", bytes(8 * CAPACITY))
+_kinds = array("B", bytes(CAPACITY))
+_threads = array("L", bytes(array("L").itemsize * CAPACITY))
+_counter = itertools.count()
+_written = 0
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+def start():
+    return time.perf_counter_ns() if enabled else 0
+
+def end(kind, t0):
+    """Records a span that began at t0 (from start())."""
+    if not t0:
+        return
+    _record(kind, t0, time.perf_counter_ns() - t0)
+
+def instant(kind):
+    """Records a zero-length event, e.g. a button edge."""
+    if enabled:
+        _record(kind, time.perf_counter_ns(), 0)
+
+def _record(kind, t0, duration):
+    global _written
+    # next() on itertools.count is atomic under the GIL, so threads never
+    # get the same slot without taking a lock.
+    n = next(_counter)
+    i = n % CAPACITY
+    _starts[i] = t0
+    _durations[i] = duration
+    _kinds[i] = kind
+    _threads[i] = threading.get_native_id()
+    _written = max(_written, n + 1)
+
+def events():
+    """Returns the buffered events as (kind, start_ns, duration_ns, tid)."""
+    count = min(_written, CAPACITY)
+    first = _written - count
+    out = []
+    for n in range(first, _written):
+        i = n % CAPACITY
+        out.append((_kinds[i], _starts[i], _durations[i], _threads[i]))
+    return out
+
+def export_chrome(path=TRACE_PATH):
+    pid = os.getpid()
+    trace = []
+    for kind, t0, duration, tid in events():
+        event = {"name": NAMES[kind], "pid": pid, "tid": tid, "ts": t0 / 1000}
+        if duration:
+            event.update(ph="X", dur=duration / 1000)
+        else:
+            event.update(ph="i", s="t")
+        trace.append(event)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+    return len(trace)
+
+def configure_from_env():
+    enable(os.environ.get("NGRAM_TRACE", "") not in ("", "0"))
+
+def install_signal_handlers(path=TRACE_PATH):
+    def toggle(signum, frame):
+        enable(not enabled)
+        print("Tracing", "on" if enabled else "off")
+
+    def dump(signum, frame):
+        print("Wrote", export_chrome(path), "trace events to", path)
+
+    signal.signal(signal.SIGUSR1, toggle)
+    signal.signal(signal.SIGUSR2, dump)
@@ -0,0 +1,66 @@
+# transitions.py
+"""
+Screen transitions built from SH1106 register tricks instead of repaints.
+
+Each transition is an effect factory: it returns a function taking the panel
+that the render thread steps once per frame. A step costs one to three
+command bytes, compared to ~1 KB for pushing a new frame. Effects restore
+the panel registers they touched when they finish or are replaced.
+
+    transitions.slide_in(renderer, frame)
+    renderer.play(transitions.flash())
+"""
+
+import sh1106
+
+def _slide(start, frames):
+    def effect(panel):
+        try:
+            for i in range(frames, 0, -1):
+                panel.set_start_line(start * i // frames)
+                yield
+        finally:
+            panel.set_start_line(0)
+    return effect
+
+def slide_in(renderer, frame, frames=8, from_line=32):
+    """
+    Shows frame rolled down by from_line rows and scrolls it up into place
+    by stepping the display start line back to 0.
+    """
+    renderer.play(_slide(sh1106.HEIGHT - from_line, frames), frame=frame)
+
+def flash(times=3, hold=2):
+    """Blinks the panel by toggling inverse mode, e.g. on a timeout."""
+    def effect(panel):
+        base = panel.inverse
+        try:
+            for _ in range(times):
+                for on in (not base, base):
+                    panel.set_inverse(on)
+                    for _ in range(hold):
+                        yield
+        finally:
+            panel.set_inverse(base)
+    return effect
+
+def invert(frames=15):
+    """Holds the panel inverted for a number of frames, e.g. on life loss."""
+    def effect(panel):
+        base = panel.inverse
+        try:
+            panel.set_inverse(not base)
+            for _ in range(frames):
+                yield
+        finally:
+            panel.set_inverse(base)
+    return effect
+
+def fade(to, frames=10):
+    """Ramps the contrast register to `to` (and leaves it there)."""
+    def effect(panel):
+        start = panel.contrast
+        for i in range(1, frames + 1):
+            panel.set_contrast(start + (to - start) * i // frames)
+            yield
+    return effect
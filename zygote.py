@@ -0,0 +1,221 @@
+# zygote.py
+"""
+Pre-loaded parent process that forks each game, so a game starts at the
+cost of a fork instead of a fresh interpreter.
+
+A game still runs in a process of its own, so a crash or a leak in it
+can't take the launcher down, which was the point of subprocess.run. But
+a new interpreter has to import pygame, PIL and the game's modules again
+before the first frame. The zygote is forked off the launcher once, at
+start-up, before the launcher opens any hardware or starts any threads.
+It imports everything in PRELOAD and then waits. For each game it forks a
+child that already has all of that in memory, copy-on-write. The child
+takes the launcher's environment, working directory and arguments, then
+runs the game script as __main__. The exit code goes back to the launcher
+exactly as subprocess.run would report it (negative for a signal).
+
+The game opens its own GPIO lines, SPI device and mixer, as it does when
+it is run directly; the zygote holds no hardware handles to pass on. The
+launcher lets go of its own lines and SPI device for the length of the
+game (menu_launcher.play()), whichever way the game is started. If
+the zygote dies, Zygote.run() returns None and the launcher falls back to
+subprocess.run for the rest of its life. NGRAM_ZYGOTE=0 turns the zygote
+off.
+
+    python3 zygote.py --games 20           # returner6.py start-up, subprocess vs fork
+    python3 zygote.py --games 20 --fake    # the same off the Pi, on fakehw
+
+The benchmark times returner6.py itself, from launch to the point where its
+first round would start (NGRAM_START_ONLY=1), with the launcher not running.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import traceback
+
+# What returner6.py imports, heaviest first. Anything missing here (no
+# pygame on a desktop, no gpiod on an old image) is skipped.
+PRELOAD = ("pygame", "PIL.Image", "PIL.ImageDraw", "PIL.ImageFont", "spidev", "gpiod",
+           "analytics", "assetpack", "buttons", "clock", "engine", "eventlog",
+           "gamestate", "gpio_backend", "idle", "menu_launcher", "metrics", "render",
+           "sh1106", "tracing", "transitions")
+MAX_MESSAGE = 1 << 20
+
+def enabled():
+    return os.environ.get("NGRAM_ZYGOTE", "") != "0"
+
+def preload(modules=PRELOAD):
+    """Imports modules; returns the names that could be imported."""
+    loaded = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            # ImportError, or RuntimeError from RPi.GPIO-style modules that
+            # refuse to import off the Pi: the game will hit the same thing.
+            continue
+        loaded.append(name)
+    return loaded
+
+###############################################################################
+# LAUNCHER SIDE
+###############################################################################
+class Zygote:
+
+    def __init__(self, pid, sock):
+        self.pid = pid
+        self.sock = sock
+
+    @classmethod
+    def start(cls, modules=PRELOAD):
+        """
+        Forks the zygote. Call before opening hardware or starting threads:
+        whatever the launcher holds at this point the zygote holds too.
+        """
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        pid = os.fork()
+        if pid == 0:
+            parent.close()
+            try:
+                _serve(child, modules)
+            finally:
+                os._exit(0)
+        child.close()
+        return cls(pid, parent)
+
+    def run(self, script, args=(), env=None):
+        """
+        Runs script with args in a fresh fork and returns its exit code, or
+        None if the zygote is gone (the caller should run it another way).
+        """
+        if self.sock is None:
+            return None
+        request = {"script": script, "args": [str(a) for a in args],
+                   "env": dict(os.environ if env is None else env), "cwd": os.getcwd()}
+        try:
+            self.sock.send(json.dumps(request).encode())
+            reply = self.sock.recv(MAX_MESSAGE)
+        except OSError:
+            reply = b""
+        if not reply:
+            print("Game zygote died; starting games with subprocess from now on.")
+            self.close()
+            return None
+        return json.loads(reply)["code"]
+
+    def close(self):
+        if self.sock is None:
+            return
+        self.sock.close()
+        self.sock = None
+        # Our end closing makes it exit; reap it.
+        try:
+            os.waitpid(self.pid, 0)
+        except ChildProcessError:
+            pass
+
+###############################################################################
+# ZYGOTE SIDE
+###############################################################################
+def _serve(sock, modules):
+    # Ctrl-C on the launcher's terminal is for the launcher (and the game).
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    preload(modules)
+    while True:
+        data = sock.recv(MAX_MESSAGE)
+        if not data:
+            return
+        request = json.loads(data)
+        pid = os.fork()
+        if pid == 0:
+            sock.close()
+            _run_game(request)
+        _, status = os.waitpid(pid, 0)
+        sock.send(json.dumps({"code": os.waitstatus_to_exitcode(status)}).encode())
+
+def _run_game(request):
+    """In the forked child: becomes the game process. Never returns."""
+    import runpy
+
+    code = 1
+    try:
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        sys.argv = [request["script"], *request["args"]]
+        sys.path[0] = os.path.dirname(os.path.abspath(request["script"]))
+        runpy.run_path(request["script"], run_name="__main__")
+        code = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        # Skip the zygote's own atexit handlers and buffered state.
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code & 0xFF)
+
+###############################################################################
+# BENCHMARK
+###############################################################################
+# Runs the game under fakehw's GPIO, SPI and mixer, for machines without them.
+_FAKE_RUNNER = ("import runpy, sys, fakehw; fakehw.install(); sys.argv = sys.argv[1:]; "
+                "runpy.run_path(sys.argv[0], run_name='__main__')")
+
+def _timed(start, games):
+    times = []
+    for _ in range(games):
+        started = time.perf_counter()
+        code = start()
+        times.append(time.perf_counter() - started)
+        if code != 0:
+            raise SystemExit(f"Game start-up failed with exit code {code}")
+    times.sort()
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--script", default="returner6.py")
+    parser.add_argument("--fake", action="store_true",
+                        help="no hardware: run the game on fakehw's stand-ins")
+    args = parser.parse_args()
+
+    # The game sets up as usual (imports, GPIO, panel, letters, word lists)
+    # and exits just before its first round.
+    env = dict(os.environ, NGRAM_LAUNCHER="1", NGRAM_START_ONLY="1")
+    if args.fake:
+        import fakehw
+
+        fakehw.install()
+        command = [sys.executable, "-c", _FAKE_RUNNER, args.script]
+    else:
+        command = [sys.executable, args.script]
+
+    zygote = Zygote.start()
+    try:
+        results = {
+            "subprocess.run": _timed(lambda: subprocess.run(command, env=env).returncode,
+                                     args.games),
+            "zygote fork": _timed(lambda: zygote.run(args.script, env=env), args.games),
+        }
+    finally:
+        zygote.close()
+    print(f"{'start':16} {'p50 ms':>8} {'p90 ms':>8}")
+    for name, times in results.items():
+        print(f"{name:16} {times[len(times) // 2] * 1e3:8.1f} {times[len(times) * 9 // 10] * 1e3:8.1f}")
+
+if __name__ == "__main__":
+    main()